@@ -0,0 +1,134 @@
+from typing import Dict, List
+from delay_functions import DelayTypes
+
+import math
+import sqlite3
+
+def wilson_interval_width(successes: int, count: int, z: float = 1.96) -> float:
+    """
+    Returns the width of the Wilson score interval of a proportion. Cells without samples have the width 1
+    """
+    if count == 0:
+        return 1.0
+    p = successes / count
+    return 2 * z * math.sqrt(p * (1 - p) / count + z * z / (4 * count * count)) / (1 + z * z / count)
+
+def format_cell(cell: Dict[str, object]) -> str:
+    """
+    Returns the cell drawn by next_cell as it is recorded in the campaign journal, e.g.
+    number_of_nodes=3,number_of_variables=5,delay_type=UNIFORM
+    """
+    return ",".join(f"{dimension}={getattr(value, 'name', value)}" for dimension, value in cell.items())
+
+class AdaptiveSampler:
+    """
+    Chooses the number of nodes, the number of variables and the delay type of the next parameter set.
+    Every value of these parameters is a cell of the evaluation tables. The cells are weighted by the Wilson
+    width of their GOOD/BAD proportion, cells whose width is narrower than the target width are not sampled
+    anymore. The stopping rule only uses this width, not the rates, detection delays or statistics of the
+    evaluation tables, which can still vary more in a finished cell.
+
+    The cells are drawn from the contents of the database and the pending samples of the simulation process, so
+    a seed does not map to a fixed parameter set: a campaign with --adaptive-width is not reproducible from its
+    seeds, also not when it is resumed. The drawn cell is recorded in the campaign journal of every seed
+    """
+    database_name: str
+    target_width: float
+    refresh_interval: int
+    max_number_of_nodes: int
+    max_number_of_variables_per_node: int
+
+    # cell counts per dimension: value -> [good, good + bad]
+    counts: Dict[str, Dict[object, List[int]]]
+
+    def __init__(self, database_name: str, target_width: float, max_number_of_nodes: int,
+                 max_number_of_variables_per_node: int, refresh_interval: int = 20):
+        self.database_name = database_name
+        self.target_width = target_width
+        self.max_number_of_nodes = max_number_of_nodes
+        self.max_number_of_variables_per_node = max_number_of_variables_per_node
+        self.refresh_interval = refresh_interval
+        self.samples_since_refresh = refresh_interval
+        self.counts = dict()
+        self.pending = dict()
+
+    def _cells(self) -> Dict[str, List[object]]:
+        return {
+            'number_of_nodes': list(range(2, self.max_number_of_nodes + 1)),
+            'number_of_variables': list(range(2, self.max_number_of_nodes * self.max_number_of_variables_per_node + 1)),
+            'delay_type': [delay_type.name for delay_type in DelayTypes],
+        }
+
+    def refresh(self):
+        """
+        Reads the current per-cell counts from the results database
+        """
+        self.counts = {dimension: {value: [0, 0] for value in values} for dimension, values in self._cells().items()}
+        self.pending = {dimension: dict() for dimension in self.counts}
+        try:
+            con = sqlite3.connect(self.database_name, timeout=60)
+            rows = con.execute("""
+                SELECT simulation.number_of_nodes, variables.number_of_variables, simulation.delay_type,
+                       simulation.category, COUNT(*)
+                FROM simulation JOIN (
+                    SELECT simulation_id, SUM(value) AS number_of_variables
+                    FROM number_of_variables_per_node GROUP BY simulation_id) AS variables
+                ON variables.simulation_id = simulation.id
+                WHERE simulation.category IN ('GOOD', 'BAD')
+                GROUP BY 1, 2, 3, 4""").fetchall()
+            con.close()
+        except sqlite3.OperationalError:
+            rows = []
+        for number_of_nodes, number_of_variables, delay_type, category, count in rows:
+            for dimension, value in (('number_of_nodes', number_of_nodes), ('number_of_variables', number_of_variables),
+                                     ('delay_type', delay_type)):
+                if value in self.counts[dimension]:
+                    if category == 'GOOD':
+                        self.counts[dimension][value][0] += count
+                    self.counts[dimension][value][1] += count
+        self.samples_since_refresh = 0
+
+    def width(self, dimension: str, value) -> float:
+        good, count = self.counts[dimension][value]
+        pending = self.pending[dimension].get(value, 0)
+        # samples that are not classified yet are expected to follow the current proportion
+        if count > 0:
+            good += pending * good / count
+        return wilson_interval_width(good, count + pending)
+
+    def _weights(self, dimension: str, values: List[object]) -> List[float]:
+        return [max(0.0, self.width(dimension, value) - self.target_width) for value in values]
+
+    def finished(self) -> bool:
+        return all(sum(self._weights(dimension, values)) == 0 for dimension, values in self._cells().items())
+
+    def _choose(self, generator, dimension: str, values: List[object]):
+        weights = self._weights(dimension, values)
+        if sum(weights) == 0:
+            # the dimension has reached its target, it only follows the other dimensions
+            return generator.choice(values)
+        return generator.choices(values, weights=weights)[0]
+
+    def next_cell(self, generator) -> Dict[str, object]:
+        """
+        Returns the keyword arguments for get_random_parameters of the next parameter set
+        or None if every cell reached the target width
+        """
+        if self.samples_since_refresh >= self.refresh_interval:
+            self.refresh()
+        if self.finished():
+            return None
+        self.samples_since_refresh += 1
+
+        number_of_variables = self._choose(generator, 'number_of_variables', self._cells()['number_of_variables'])
+        nodes = range(max(2, math.ceil(number_of_variables / self.max_number_of_variables_per_node)),
+                      min(self.max_number_of_nodes, number_of_variables) + 1)
+        number_of_nodes = self._choose(generator, 'number_of_nodes', list(nodes))
+        delay_type = self._choose(generator, 'delay_type', self._cells()['delay_type'])
+
+        for dimension, value in (('number_of_nodes', number_of_nodes), ('number_of_variables', number_of_variables),
+                                 ('delay_type', delay_type)):
+            self.pending[dimension][value] = self.pending[dimension].get(value, 0) + 1
+
+        return {'number_of_nodes': number_of_nodes, 'number_of_variables': number_of_variables,
+                'delay_type': DelayTypes[delay_type]}
@@ -11,6 +11,7 @@ class ParameterCategories(Enum):
     BAD = 2     # contained only hard / impossible to detect control faults
     FAULTY = 3  # there was a fault during the execution
     TIMEOUT = 4 # one of the resulting simulations timed out
+    SKIPPED = 5 # predicted to be TIMEOUT or BAD by the pre-screening and not simulated
 
 @dataclass
 class SimulationParameters:
@@ -24,6 +25,9 @@ class SimulationParameters:
     delay_type: DelayTypes
     seed: int
     category: ParameterCategories
+    parameters_hash: str = ""
+    cache_hit: bool = False
+    predicted_category: ParameterCategories = ParameterCategories.UNKNOWN
 
 class Event:
     from_node: int
@@ -0,0 +1,147 @@
+from typing import List, Set
+from base_model import SimulationParameters
+
+import numpy as np
+
+# the global states are held in uint64 and the rule function elements are looked up with shifts of uint64
+max_variables = 64
+max_dependencies = 6
+
+def supports(parameters: SimulationParameters) -> bool:
+    """
+    Returns whether the parameter set fits into the arrays of the ensemble
+    """
+    return (sum(parameters.number_of_variables_per_node) <= max_variables and
+            all(bin(rule_function.dependencies.int_representation).count("1") <= max_dependencies
+                for rule_function in parameters.rule_functions_per_node))
+
+class BaseModelEnsemble:
+    """
+    Simulates the base model of many parameter sets in lockstep. With a delay of 1 every node receives every change
+    after one time step, so all local states are equal and a time step is one update of the state of all variables.
+    The states of the instances are a uint64 array, bit i is variable i like in the local states of the nodes, and the
+    rule functions are stacked into arrays of dependency positions and elements per variable, so one time step of
+    all instances is a few array operations.
+
+    reached_states are the states reached by node 0 of BaseModelSimulationEnvironment: the initial state and, per
+    time step, the state after each changed variable, since the node applies the changes one event at a time in
+    the order of the variables. An instance is retired when its state does not change anymore, when it returns to
+    a state reached before (the rest of the run repeats the cycle, which the base model stops after
+    max_steady_space_time steps) or at stop_time. Cycles are detected with Brent's algorithm, which only keeps one
+    state per instance
+    """
+    parameter_sets: List[SimulationParameters]
+    reached_states: List[Set[int]]
+    transitions: np.ndarray # time steps per instance in which the state changed
+
+    def __init__(self, parameter_sets: List[SimulationParameters]):
+        for parameters in parameter_sets:
+            if not supports(parameters):
+                raise ValueError(f"Parameter set {parameters.seed} exceeds {max_variables} variables or "
+                                 f"{max_dependencies} dependencies per node")
+        self.parameter_sets = parameter_sets
+        self.reached_states = [{parameters.initial_state} for parameters in parameter_sets]
+        self.transitions = np.zeros(len(parameter_sets), dtype=np.int64)
+
+        number_of_variables = max([sum(parameters.number_of_variables_per_node) for parameters in parameter_sets],
+                                  default=0)
+        self.positions = np.zeros((len(parameter_sets), number_of_variables, max_dependencies), dtype=np.uint64)
+        self.dependency_masks = np.zeros((len(parameter_sets), number_of_variables, max_dependencies),
+                                         dtype=np.uint64)
+        # variables beyond the variables of a parameter set have the element 0 and stay 0
+        self.elements = np.zeros((len(parameter_sets), number_of_variables), dtype=np.uint64)
+        for m, parameters in enumerate(parameter_sets):
+            variable = 0
+            for rule_function in parameters.rule_functions_per_node:
+                dependencies = rule_function.dependencies.int_representation
+                positions = [bit for bit in range(dependencies.bit_length()) if (dependencies >> bit) & 1]
+                # bit i of the rule function result is the element counted from the end, see RuleFunction.evaluate
+                for element in reversed(rule_function.elements):
+                    self.positions[m, variable, :len(positions)] = positions
+                    self.dependency_masks[m, variable, :len(positions)] = 1
+                    self.elements[m, variable] = element.int_representation
+                    variable += 1
+        self.states = np.array([parameters.initial_state for parameters in parameter_sets], dtype=np.uint64)
+
+    def step(self, states: np.ndarray, positions: np.ndarray, dependency_masks: np.ndarray,
+             elements: np.ndarray) -> np.ndarray:
+        """
+        Returns the states of the next time step of the instances of the arrays
+        """
+        dependency_bits = (states[:, None, None] >> positions) & dependency_masks
+        subspaces = (dependency_bits << np.arange(max_dependencies, dtype=np.uint64)).sum(axis=2, dtype=np.uint64)
+        results = (elements >> subspaces) & np.uint64(1)
+        return (results << np.arange(elements.shape[1], dtype=np.uint64)).sum(axis=1, dtype=np.uint64)
+
+    def run(self, stop_time: int, flush_interval: int = 256):
+        """
+        Simulates all instances until they are retired, at the latest at stop_time like the base model
+        """
+        number_of_variables = self.elements.shape[1]
+        # the states after the changes of the variables up to k: state ^ (changes & prefix_masks[k])
+        prefix_masks = np.array([(2 << k) - 1 for k in range(number_of_variables)], dtype=np.uint64)
+        variable_bits = np.arange(number_of_variables, dtype=np.uint64)
+
+        active = np.arange(len(self.parameter_sets))
+        states = self.states
+        positions, dependency_masks, elements = self.positions, self.dependency_masks, self.elements
+        # Brent's cycle detection: the saved state is replaced after power steps, power doubles every time
+        saved_states = states.copy()
+        power = np.ones(len(active), dtype=np.int64)
+        steps_since_saved = np.zeros(len(active), dtype=np.int64)
+        buffered_ids, buffered_states = [], []
+
+        # the state of time step t is reached by the events of time step t-1, the first time step is 1
+        for time in range(2, stop_time + 1):
+            if len(active) == 0:
+                break
+            replace = steps_since_saved == power
+            saved_states[replace] = states[replace]
+            power[replace] *= 2
+            steps_since_saved[replace] = 0
+
+            next_states = self.step(states, positions, dependency_masks, elements)
+            changes = states ^ next_states
+            changed = ((changes[:, None] >> variable_bits) & np.uint64(1)).astype(bool)
+            intermediate_states = states[:, None] ^ (changes[:, None] & prefix_masks)
+            buffered_ids.append(np.broadcast_to(active[:, None], changed.shape)[changed])
+            buffered_states.append(intermediate_states[changed])
+            if len(buffered_ids) >= flush_interval:
+                self._add_reached_states(buffered_ids, buffered_states)
+                buffered_ids, buffered_states = [], []
+
+            moving = changes != 0
+            self.transitions[active[moving]] += 1
+            states = next_states
+            steps_since_saved += 1
+            # a fixed point does not send events anymore, a cycle repeats the reached states
+            keep = moving & (states != saved_states)
+            if not keep.all():
+                self.states[active[~keep]] = states[~keep]
+                active, states, saved_states = active[keep], states[keep], saved_states[keep]
+                power, steps_since_saved = power[keep], steps_since_saved[keep]
+                positions, dependency_masks, elements = positions[keep], dependency_masks[keep], elements[keep]
+        self.states[active] = states
+        self._add_reached_states(buffered_ids, buffered_states)
+
+    def _add_reached_states(self, buffered_ids: List[np.ndarray], buffered_states: List[np.ndarray]):
+        if not buffered_ids:
+            return
+        ids = np.concatenate(buffered_ids)
+        states = np.concatenate(buffered_states)
+        # the states of each instance are added at once in the order they were reached. The iteration order of a
+        # set depends on the insertion order, and the fault spaces are drawn from the iteration order
+        order = np.argsort(ids, kind='stable')
+        ids, states = ids[order], states[order]
+        boundaries = np.flatnonzero(np.diff(ids)) + 1
+        for group_ids, group_states in zip(np.split(ids, boundaries), np.split(states, boundaries)):
+            if len(group_ids):
+                self.reached_states[int(group_ids[0])].update(group_states.tolist())
+
+def ensemble_base_model_states(parameter_sets: List[SimulationParameters], stop_time: int) -> List[Set[int]]:
+    """
+    Returns the states reached by node 0 of the base model of every parameter set, see BaseModelEnsemble
+    """
+    ensemble = BaseModelEnsemble(parameter_sets)
+    ensemble.run(stop_time)
+    return ensemble.reached_states
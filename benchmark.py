@@ -0,0 +1,202 @@
+from multiprocessing import Queue, Value
+from signal import SIGINT, getsignal, signal
+from typing import Dict, List, Tuple
+from base_model import BaseModelSimulationEnvironment, ParameterCategories, SimulationParameters
+from delay_functions import DelayTypes
+from distributed_model import DistributedModelSimulationEnvironment
+from error_model import ErrorSimulationModel
+from storage import NullStorage
+
+import argparse
+import json
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+
+import simulation
+
+# (number of nodes, number of variables) from the smallest to the largest parameter sets of the campaign
+corpus_sizes = [(2, 2), (5, 12), (simulation.max_number_of_nodes,
+                                   simulation.max_number_of_nodes * simulation.max_number_of_variables_per_node)]
+engines = ['base', 'distributed', 'error']
+# a measured value is a regression if it is worse than the baseline by more than the threshold, relative
+default_thresholds = {'wall_seconds': 0.1, 'ticks_per_second': 0.1, 'events_per_second': 0.1,
+                      'peak_memory_bytes': 0.2}
+# values that are better when lower
+lower_is_better = {'wall_seconds', 'peak_memory_bytes'}
+# short benchmarks are repeated for at least this long, single runs of a millisecond are too noisy to compare
+min_total_seconds = 0.5
+
+def corpus() -> List[Tuple[str, SimulationParameters]]:
+    """
+    Returns the benchmark parameter sets, one per delay type with the sizes cycling from the smallest to the
+    largest. The parameter sets are generated from fixed seeds, so every run benchmarks the same simulations
+    """
+    parameter_sets = []
+    for i, delay_type in enumerate(DelayTypes):
+        number_of_nodes, number_of_variables = corpus_sizes[i % len(corpus_sizes)]
+        random.seed(1000 + i)
+        parameters = simulation.get_random_parameters(simulation.max_number_of_nodes,
+                                                      simulation.max_number_of_variables_per_node,
+                                                      simulation.max_number_of_dependencies_per_node,
+                                                      number_of_nodes, number_of_variables, delay_type)
+        parameter_sets.append((f"{delay_type.name.lower()}_{number_of_nodes}x{number_of_variables}", parameters))
+    return parameter_sets
+
+def create_environment(engine: str, parameters: SimulationParameters, fault_space):
+    if engine == 'base':
+        return BaseModelSimulationEnvironment(parameters)
+    elif engine == 'distributed':
+        return DistributedModelSimulationEnvironment(parameters)
+    return ErrorSimulationModel(parameters, fault_space=fault_space)
+
+def control_fault_space(parameters: SimulationParameters, stop_time: int):
+    """
+    Returns a fixed fault space for the error model: every second state reached by the distributed model
+    """
+    random.seed(parameters.seed)
+    env = DistributedModelSimulationEnvironment(parameters)
+    env.run(stop_time)
+    return set(sorted(env.nodes[0].reached_states)[::2])
+
+def measure(run, repeat: int) -> Dict[str, float]:
+    """
+    Runs run at least repeat times and for min_total_seconds, then once more under tracemalloc for the peak memory.
+    run returns the environment it ran, the time steps, events and rates are those of the run with the most time steps
+    per second. Runs stopped by the time budget all take about the budget and simulate different numbers of time
+    steps, so they are compared by their rate and not mixed
+    """
+    wall_seconds = None
+    ticks_per_second = None
+    env = None
+    runs = 0
+    total_seconds = 0
+    while runs < repeat or total_seconds < min_total_seconds:
+        start = time.perf_counter()
+        run_env = run()
+        duration = time.perf_counter() - start
+        run_ticks_per_second = (run_env.time if run_env is not None else 0) / duration
+        if ticks_per_second is None or run_ticks_per_second > ticks_per_second:
+            ticks_per_second, wall_seconds, env = run_ticks_per_second, duration, run_env
+        runs += 1
+        total_seconds += duration
+    tracemalloc.start()
+    # tracemalloc slows the run down, with a time budget it simulates fewer time steps
+    memory_env = run()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    ticks = env.time if env is not None else 0
+    events = env.event_count if env is not None else 0
+    return {'wall_seconds': wall_seconds, 'ticks': ticks, 'events': events,
+            'ticks_per_second': ticks / wall_seconds, 'events_per_second': events / wall_seconds,
+            'peak_memory_bytes': peak_memory, 'timed_out': env is not None and env.timed_out,
+            'memory_run_timed_out': memory_env is not None and memory_env.timed_out}
+
+def benchmark_engine(engine: str, parameters: SimulationParameters, stop_time: int, repeat: int,
+                     time_budget: float):
+    """
+    Measures an engine simulating the parameter set until stop_time. Runs exceeding the time budget are stopped like
+    simulations exceeding the campaign timeout, their rates are computed from the time steps simulated until then
+    """
+    fault_space = control_fault_space(parameters, stop_time) if engine == 'error' else None
+
+    def run():
+        # the simulations draw from the global random generator, every run draws the same numbers
+        random.seed(parameters.seed)
+        env = create_environment(engine, parameters, fault_space)
+        env.timeout_after = time_budget
+        env.run(stop_time)
+        return env
+    return measure(run, repeat)
+
+def benchmark_worker_iteration(stop_time: int, repeat: int, seed: int = 0):
+    """
+    Measures start_simulating simulating one seed end to end without storage. The result cache is empty in every
+    run, so all phases run
+    """
+    def run():
+        tasks = Queue()
+        tasks.put([seed])
+        tasks.put(None)
+        counts = [0] * len(ParameterCategories)
+        saved = simulation.result_cache_directory, simulation.stop_time, getsignal(SIGINT)
+        with tempfile.TemporaryDirectory() as directory:
+            simulation.result_cache_directory, simulation.stop_time = directory, stop_time
+            try:
+                simulation.start_simulating(NullStorage(), tasks, counts, Value('d', 0))
+            finally:
+                # start_simulating ignores SIGINT like a worker process
+                simulation.result_cache_directory, simulation.stop_time, sigint_handler = saved
+                signal(SIGINT, sigint_handler)
+        return None
+    return measure(run, repeat)
+
+def run_benchmarks(stop_time: int, repeat: int, time_budget: float, selected_engines: List[str] = engines,
+                   worker_iteration: bool = True) -> dict:
+    results = dict()
+    for name, parameters in corpus():
+        for engine in selected_engines:
+            results[f"{engine}/{name}"] = benchmark_engine(engine, parameters, stop_time, repeat, time_budget)
+            print(f"{engine}/{name}: {results[f'{engine}/{name}']['wall_seconds']:.3f}s")
+    if worker_iteration:
+        results['start_simulating/seed_0'] = benchmark_worker_iteration(stop_time, repeat)
+        print(f"start_simulating/seed_0: {results['start_simulating/seed_0']['wall_seconds']:.3f}s")
+    return {'configuration': {'stop_time': stop_time, 'repeat': repeat, 'time_budget': time_budget, 'python': platform.python_version(),
+                              'machine': platform.machine()},
+            'results': results}
+
+def compare(results: dict, baseline: dict, thresholds: Dict[str, float] = default_thresholds) -> List[str]:
+    """
+    Returns a description of every value of the results that regressed against the baseline by more than its
+    threshold. Benchmarks missing in either file are ignored
+    """
+    regressions = []
+    for name, values in results['results'].items():
+        baseline_values = baseline['results'].get(name)
+        if baseline_values is None:
+            continue
+        for key, threshold in thresholds.items():
+            value, baseline_value = values[key], baseline_values[key]
+            if baseline_value == 0:
+                continue
+            change = (value - baseline_value) / baseline_value
+            if key not in lower_is_better:
+                change = -change
+            if change > threshold:
+                regressions.append(f"{name} {key}: {baseline_value:.6g} -> {value:.6g} ({change:+.1%} worse)")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the simulation engines on a fixed corpus of parameter "
+                                                 "sets and compares the results with a baseline")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file the results are written to")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--stop-time", type=int, default=2000, help="time steps simulated per run")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark, the fastest counts")
+    parser.add_argument("--time-budget", type=float, default=10, help="seconds after which a run is stopped, the "
+                                                                     "largest parameter sets need hours otherwise")
+    parser.add_argument("--engines", nargs="+", choices=engines, default=engines)
+    parser.add_argument("--skip-worker", action="store_true", help="skip the start_simulating iteration")
+    parser.add_argument("--time-threshold", type=float, default=default_thresholds['wall_seconds'],
+                        help="allowed relative slowdown of the wall time and rates")
+    parser.add_argument("--memory-threshold", type=float, default=default_thresholds['peak_memory_bytes'],
+                        help="allowed relative increase of the peak memory")
+    arguments = parser.parse_args()
+
+    results = run_benchmarks(arguments.stop_time, arguments.repeat, arguments.time_budget, arguments.engines,
+                             not arguments.skip_worker)
+    with open(arguments.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+        if baseline['configuration']['stop_time'] != arguments.stop_time:
+            print("The baseline was measured with a different stop time")
+        thresholds = {'wall_seconds': arguments.time_threshold, 'ticks_per_second': arguments.time_threshold,
+                      'events_per_second': arguments.time_threshold, 'peak_memory_bytes': arguments.memory_threshold}
+        regressions = compare(results, baseline, thresholds)
+        for regression in regressions:
+            print("Regression:", regression)
+        exit(1 if regressions else 0)
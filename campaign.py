@@ -0,0 +1,68 @@
+from typing import Dict, Iterator, List, Tuple
+from base_model import ParameterCategories
+
+import itertools
+import sqlite3
+
+def campaign_seeds(seed_start: int = 0, seed_end: int = None, shard_index: int = 0, shard_count: int = 1) -> Iterator[int]:
+    """
+    Returns the simulation seeds of a shard of the campaign. Every seed of the range [seed_start, seed_end)
+    belongs to exactly one shard, so the shards can run on different hosts and their results can be merged.
+    Without seed_end the campaign runs until it is stopped.
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f'shard index {shard_index} is not in [0, {shard_count})')
+    if seed_end is None:
+        return itertools.count(seed_start + shard_index, shard_count)
+    return iter(range(seed_start + shard_index, seed_end, shard_count))
+
+class CampaignJournalEntry:
+    seed: int = 0
+    completed: bool = False
+    cell: str = None # cell drawn by the adaptive sampler, the seed alone does not reproduce its parameter set
+
+def create_journal_index(connection):
+    """
+    Creates the unique index of the journal seeds, which every journal entry is looked up by. A database merged
+    from overlapping campaigns can journal a seed twice, it gets a plain index
+    """
+    try:
+        connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS campaign_journal_seed ON campaign_journal(seed)")
+    except sqlite3.IntegrityError:
+        connection.execute("CREATE INDEX IF NOT EXISTS campaign_journal_seed ON campaign_journal(seed)")
+
+def resume_seeds(seeds: Iterator[int], journal: List[Tuple[int, bool]]) -> Iterator[int]:
+    """
+    Continues a campaign from its journal: seeds that were in flight when the campaign stopped are simulated first,
+    completed seeds are skipped
+    """
+    completed = set(seed for seed, seed_completed in journal if seed_completed)
+    in_flight = [seed for seed, seed_completed in journal if not seed_completed and seed not in completed]
+    yield from in_flight
+    skipped = completed.union(in_flight)
+    for seed in seeds:
+        if seed not in skipped:
+            yield seed
+
+def parse_targets(targets: str) -> Dict[ParameterCategories, int]:
+    """
+    Parses per-category targets of the form GOOD=100,BAD=50
+    """
+    parsed = dict()
+    for target in targets.split(','):
+        category, count = target.split('=')
+        if category.strip().upper() not in ParameterCategories.__members__:
+            raise ValueError(f'Unknown category {category}')
+        parsed[ParameterCategories[category.strip().upper()]] = int(count)
+    return parsed
+
+def shard_targets(targets: Dict[ParameterCategories, int], shard_index: int = 0,
+                  shard_count: int = 1) -> Dict[ParameterCategories, int]:
+    """
+    Returns the part of the campaign targets a shard has to reach, the shards together reach the campaign targets
+    """
+    return {category: count // shard_count + (1 if shard_index < count % shard_count else 0)
+            for category, count in targets.items()}
+
+def targets_reached(targets: Dict[ParameterCategories, int], counts: List[int]) -> bool:
+    return all(counts[category.value] >= count for category, count in targets.items())
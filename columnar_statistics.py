@@ -0,0 +1,156 @@
+from typing import Dict, Iterator, List, Tuple
+from pandas.core.frame import DataFrame
+
+import argparse
+import numpy as np
+import pandas as pd
+import sqlite3
+import zlib
+
+statistics_tables = [model + algorithm + '_statistics' for model in ['control_', 'infrastructure_']
+                     for algorithm in ['full_state', 'timestamp', 'token']]
+
+# column name, stored type and whether the differences to the previous value are stored.
+# The time advances by one per row, so its differences compress to almost nothing
+series_columns: List[Tuple[str, str, bool]] = [
+    ('time', '<i8', True),
+    ('error_detected', '|u1', False),
+    ('band_width_used', '<i8', False),
+    ('memory_used', '<i8', False),
+]
+
+def create_series_table(connection):
+    """
+    Creates the table storing the statistics series of every simulation, one row per simulation and statistics
+    table with a zlib compressed array per column
+    """
+    connection.execute(f"CREATE TABLE IF NOT EXISTS statistics_series (id INTEGER PRIMARY KEY, simulation_id INTEGER, "
+                       f"table_name TEXT, length INTEGER, "
+                       f"{','.join(column + ' BLOB' for column, _, _ in series_columns)})")
+
+def encode_column(values: np.ndarray, dtype: str, delta: bool) -> bytes:
+    values = values.astype(dtype)
+    if delta:
+        values = np.diff(values, prepend=values.dtype.type(0))
+    return zlib.compress(values.tobytes())
+
+def decode_column(blob: bytes, dtype: str, delta: bool) -> np.ndarray:
+    values = np.frombuffer(zlib.decompress(blob), dtype=dtype)
+    if delta:
+        values = np.cumsum(values)
+    return values
+
+def encode_series(statistics) -> List[bytes]:
+    """
+    Returns the compressed columns of the statistics of a simulation
+    """
+    return [encode_column(np.fromiter((getattr(statistic, column) for statistic in statistics), dtype=dtype,
+                                      count=len(statistics)), dtype, delta)
+            for column, dtype, delta in series_columns]
+
+def insert_series(connection, table_name: str, statistics, simulation_reference: int):
+    """
+    Inserts the statistics of a simulation as one compressed series
+    """
+    insert_encoded_series(connection, table_name, simulation_reference, len(statistics), encode_series(statistics))
+
+def insert_encoded_series(connection, table_name: str, simulation_reference: int, length: int, values: List[bytes]):
+    connection.execute(f"INSERT INTO statistics_series(simulation_id,table_name,length,"
+                       f"{','.join(column for column, _, _ in series_columns)}) VALUES (?,?,?,"
+                       f"{','.join('?' for _ in series_columns)})",
+                       [simulation_reference, table_name, length] + values)
+
+def without_rows_condition(connection, table_name: str) -> str:
+    """
+    Returns a condition on the simulation_id of statistics_series excluding the simulations that still have rows
+    in the statistics table. A migration without drop_rows keeps the rows, the rows are read then
+    """
+    if not connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", [table_name]).fetchone():
+        return "1"
+    return f"simulation_id NOT IN (SELECT DISTINCT simulation_id FROM {table_name})"
+
+def iterate_series(connection, table_name: str, simulation_ids: List[int] = None) -> Iterator[Tuple[int, Dict[str, np.ndarray]]]:
+    """
+    Yields the simulation id and the decoded columns of every stored series of the statistics table, except of the
+    simulations that still have rows
+    """
+    query = f"SELECT simulation_id, {','.join(column for column, _, _ in series_columns)} FROM statistics_series " \
+            f"WHERE table_name = ? AND {without_rows_condition(connection, table_name)}"
+    arguments = [table_name]
+    if simulation_ids is not None:
+        query += f" AND simulation_id IN ({','.join('?' for _ in simulation_ids)})"
+        arguments += list(simulation_ids)
+    for row in connection.execute(query + " ORDER BY simulation_id", arguments):
+        yield row[0], {column: decode_column(blob, dtype, delta)
+                       for blob, (column, dtype, delta) in zip(row[1:], series_columns)}
+
+def read_statistics(connection, table_name: str, simulation_ids: List[int] = None) -> DataFrame:
+    """
+    Returns the statistics of the table in the row layout of the statistics tables, no matter if they are stored
+    as rows, as compressed series or both. A simulation stored both ways is returned once, from the rows
+    """
+    frames = []
+    if connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", [table_name]).fetchone():
+        query = f"SELECT simulation_id, {','.join(column for column, _, _ in series_columns)} FROM {table_name}"
+        arguments = []
+        if simulation_ids is not None:
+            query += f" WHERE simulation_id IN ({','.join('?' for _ in simulation_ids)})"
+            arguments = list(simulation_ids)
+        frames.append(pd.read_sql_query(query, connection, params=arguments))
+    if connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'statistics_series'").fetchone():
+        for simulation_id, columns in iterate_series(connection, table_name, simulation_ids):
+            frame = DataFrame(columns)
+            frame.insert(0, 'simulation_id', simulation_id)
+            frames.append(frame)
+    if not frames:
+        return DataFrame(columns=['simulation_id'] + [column for column, _, _ in series_columns])
+    return pd.concat(frames, ignore_index=True)
+
+def migrate(database: str, drop_rows: bool = False, chunk_size: int = 1000000):
+    """
+    Converts the statistics rows of an existing database to compressed series. Simulations that already have a
+    series are skipped, so an interrupted migration can be continued. With drop_rows the row tables are dropped and
+    the file is compacted afterwards
+    """
+    connection = sqlite3.connect(database)
+    create_series_table(connection)
+    for table_name in statistics_tables:
+        if not connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", [table_name]).fetchone():
+            continue
+        migrated = set(row[0] for row in connection.execute(
+            "SELECT simulation_id FROM statistics_series WHERE table_name = ?", [table_name]))
+        columns = ','.join(column for column, _, _ in series_columns)
+        # the rows of a simulation are consecutive, so a chunk only holds a partial series at its end
+        partial = None
+        for chunk in pd.read_sql_query(f"SELECT simulation_id, {columns} FROM {table_name} ORDER BY simulation_id, id",
+                                       connection, chunksize=chunk_size):
+            if chunk.empty:
+                continue
+            if partial is not None:
+                chunk = pd.concat([partial, chunk], ignore_index=True)
+            last_simulation = chunk['simulation_id'].iloc[-1]
+            partial = chunk[chunk['simulation_id'] == last_simulation]
+            _insert_chunk(connection, table_name, chunk[chunk['simulation_id'] != last_simulation], migrated)
+        if partial is not None:
+            _insert_chunk(connection, table_name, partial, migrated)
+        connection.commit()
+    if drop_rows:
+        for table_name in statistics_tables:
+            connection.execute(f"DROP TABLE IF EXISTS {table_name}")
+        connection.commit()
+        connection.execute("VACUUM")
+    connection.close()
+
+def _insert_chunk(connection, table_name: str, chunk: DataFrame, migrated):
+    for simulation_id, series in chunk.groupby('simulation_id', sort=False):
+        if simulation_id in migrated:
+            continue
+        values = [encode_column(series[column].to_numpy(), dtype, delta) for column, dtype, delta in series_columns]
+        insert_encoded_series(connection, table_name, int(simulation_id), len(series), values)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrates the statistics tables of a database to compressed series")
+    parser.add_argument("database")
+    parser.add_argument("--drop-rows", action="store_true", help="drop the statistics tables after the migration")
+    arguments = parser.parse_args()
+    migrate(arguments.database, arguments.drop_rows)
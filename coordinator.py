@@ -0,0 +1,311 @@
+from multiprocessing import AuthenticationError, Process
+from multiprocessing.connection import Client, Listener
+from queue import Empty, Queue
+from signal import SIGINT, signal
+from typing import Dict, Iterator, List, Set
+from base_model import ParameterCategories
+from campaign import campaign_seeds, resume_seeds
+from database import default_database_name
+from metrics import MetricsCollector
+from result_cache import ResultCache
+from simulation import ensemble_base_model_states, result_cache_directory, sigint_handler, simulate_seed
+from simulation_env import SimulationEnvironment
+from simulation_profiling import SimulationProfiling
+from storage import StorageBackend, create_storage
+
+import argparse
+import os
+import profiler
+import threading
+import time
+
+class Batch:
+    id: int
+    seeds: List[int]
+    deadline: float
+    worker: int
+
+class Coordinator:
+    """
+    Hands out seed batches to worker processes connecting over TCP and writes their results to the storage.
+    Batches of workers that disconnected or missed their deadline are issued again, results of seeds that were
+    already written are dropped.
+    """
+    seeds: Iterator[int]
+    batch_size: int
+    batch_timeout: float
+    pending_seeds: List[int]
+    in_flight: Dict[int, Batch]
+    completed_seeds: Set[int]
+    counts: List[int]
+
+    def __init__(self, address, authkey: bytes, seeds: Iterator[int], storage: StorageBackend, batch_size: int = 1,
+                 batch_timeout: float = 4 * SimulationEnvironment.timeout_after,
+                 metrics_collector: MetricsCollector = None):
+        self.listener = Listener(address, authkey=authkey)
+        self.seeds = seeds
+        self.batch_size = batch_size
+        # a parameter set runs up to four simulations which can each take until the timeout
+        self.batch_timeout = batch_timeout * batch_size
+        self.pending_seeds = []
+        self.seeds_exhausted = False
+        self.in_flight = dict()
+        self.completed_seeds = set()
+        self.counts = [0] * len(ParameterCategories)
+        self.next_batch_id = 0
+        self.next_worker_id = 0
+        self.lock = threading.Lock()
+        self.storage = storage
+        self.closed = False
+        self.metrics_collector = metrics_collector
+        # results and journal entries are written by the main thread, which owns the storage
+        self.results = Queue()
+
+    def _next_batch(self, worker: int) -> Batch:
+        seeds = self.pending_seeds[:self.batch_size]
+        self.pending_seeds = self.pending_seeds[self.batch_size:]
+        while len(seeds) < self.batch_size and not self.seeds_exhausted:
+            seed = next(self.seeds, None)
+            if seed is None:
+                self.seeds_exhausted = True
+            else:
+                seeds.append(seed)
+        if not seeds:
+            return None
+        batch = Batch()
+        batch.id = self.next_batch_id
+        batch.seeds = seeds
+        batch.deadline = time.time() + self.batch_timeout
+        batch.worker = worker
+        self.next_batch_id += 1
+        self.in_flight[batch.id] = batch
+        return batch
+
+    def _reissue(self, batch: Batch):
+        if self.in_flight.pop(batch.id, None) is not None:
+            self.pending_seeds.extend(seed for seed in batch.seeds if seed not in self.completed_seeds)
+
+    def _release_completed(self):
+        # a batch issued again holds the same seeds as the original, whichever worker completes them
+        for batch in list(self.in_flight.values()):
+            if all(seed in self.completed_seeds for seed in batch.seeds):
+                del self.in_flight[batch.id]
+
+    def finished(self) -> bool:
+        with self.lock:
+            return self.seeds_exhausted and not self.pending_seeds and not self.in_flight
+
+    def _serve(self, connection, worker: int):
+        try:
+            while True:
+                message = connection.recv()
+                if message[0] == 'request':
+                    with self.lock:
+                        batch = self._next_batch(worker)
+                        done = batch is None and self.seeds_exhausted and not self.pending_seeds and not self.in_flight
+                    if batch is not None:
+                        self.results.put(('started', batch.seeds))
+                        connection.send(('batch', batch.id, batch.seeds))
+                    elif done:
+                        connection.send(('done',))
+                        return
+                    else:
+                        # in-flight batches might still be issued again
+                        connection.send(('wait', 1))
+                elif message[0] == 'result':
+                    if message[3].metrics is not None:
+                        message[3].metrics.worker = worker
+                        message[3].metrics.finished_at = time.time()
+                    self.results.put(message)
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+            with self.lock:
+                for batch in list(self.in_flight.values()):
+                    if batch.worker == worker:
+                        self._reissue(batch)
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except (EOFError, OSError, AuthenticationError):
+                # failed handshake or closed listener
+                if self.closed:
+                    return
+                continue
+            with self.lock:
+                worker = self.next_worker_id
+                self.next_worker_id += 1
+            threading.Thread(target=self._serve, args=(connection, worker), daemon=True).start()
+
+    def _write(self, message):
+        if message[0] == 'started':
+            # the seeds of an issued batch are journaled as in flight
+            for seed in message[1]:
+                self.storage.write_started(seed)
+            self.storage.commit()
+            return
+        _, batch_id, seed, result = message
+        with self.lock:
+            if seed in self.completed_seeds:
+                # the batch was issued again and completed by the other worker
+                self._release_completed()
+                return
+            self.completed_seeds.add(seed)
+        write_start = time.perf_counter()
+        self.storage.write_result(result)
+        self.storage.commit()
+        if result.metrics is not None:
+            result.metrics.phase_times['db_write'] = time.perf_counter() - write_start
+        if self.metrics_collector is not None and result.metrics is not None:
+            self.metrics_collector.record(result.metrics)
+        with self.lock:
+            self.counts[result.parameters.category.value] += 1
+            self._release_completed()
+
+    def run(self, stopped=lambda: False, status_interval: float = 10):
+        threading.Thread(target=self._accept, daemon=True).start()
+        last_status = 0
+        while not self.finished() and not stopped():
+            try:
+                self._write(self.results.get(timeout=1))
+            except Empty:
+                pass
+            with self.lock:
+                for batch in list(self.in_flight.values()):
+                    if batch.deadline < time.time():
+                        self._reissue(batch)
+            if time.time() - last_status >= status_interval:
+                print(f"\rSimulations: {self.counts[ParameterCategories.GOOD.value]} good, "
+                      f"{self.counts[ParameterCategories.BAD.value]} bad, {self.counts[ParameterCategories.FAULTY.value]} "
+                      f"faulty, {self.counts[ParameterCategories.TIMEOUT.value]} timed out and "
+                      f"{self.counts[ParameterCategories.SKIPPED.value]} skipped", end="")
+                if self.metrics_collector is not None:
+                    self.metrics_collector.export()
+                last_status = time.time()
+        while not self.results.empty():
+            self._write(self.results.get())
+        if self.metrics_collector is not None:
+            self.metrics_collector.export()
+        self.closed = True
+        self.listener.close()
+
+def run_worker(address, authkey: bytes, sampler=None, prescreening=None, profiling: SimulationProfiling = None):
+    """
+    Simulates the seed batches handed out by the coordinator at address until the campaign is done
+    """
+    signal(SIGINT, sigint_handler)
+    result_cache = ResultCache(result_cache_directory)
+    connection = Client(address, authkey=authkey)
+    while True:
+        connection.send(('request',))
+        message = connection.recv()
+        if message[0] == 'done':
+            break
+        elif message[0] == 'wait':
+            time.sleep(message[1])
+            continue
+        _, batch_id, seeds = message
+        base_model_states, base_model_time = ensemble_base_model_states(seeds, sampler)
+        for seed in seeds:
+            session = profiling.start(seed) if profiling is not None else None
+            result = simulate_seed(seed, result_cache, sampler, prescreening, base_model_states.get(seed),
+                                   base_model_time)
+            if profiling is not None:
+                profiling.finish(session, seed, result)
+            if result is None:
+                connection.close()
+                return
+            connection.send(('result', batch_id, seed, result))
+    connection.close()
+
+# addresses only reachable from this host
+local_hosts = {"localhost", "127.0.0.1", "::1"}
+
+stopped = False
+def coordinator_sigint_handler(signum, frame):
+    global stopped
+    stopped = True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coordinates a simulation campaign over TCP. With --connect the "
+                                                 "process works for the coordinator at that address instead.")
+    parser.add_argument("database", nargs="?", help="results database or file of the coordinator, defaults to a "
+                                                    "timestamped database in simulations")
+    parser.add_argument("--storage", choices=["sqlite", "binary", "null"], default="sqlite")
+    parser.add_argument("--host", default="localhost", help="address the coordinator listens on")
+    parser.add_argument("--port", type=int, default=6000)
+    parser.add_argument("--authkey", help="shared secret of the coordinator and its workers, defaults to the "
+                                          "REV_AUTHKEY environment variable. Required for remote workers, the "
+                                          "messages are unpickled")
+    parser.add_argument("--connect", help="host:port of the coordinator to work for")
+    parser.add_argument("--processes", type=int, default=1, help="number of worker processes of this host")
+    parser.add_argument("--local-workers", type=int, default=0, help="number of workers started by the coordinator")
+    parser.add_argument("--count", type=int, help="total number of simulations of the campaign")
+    parser.add_argument("--seed-start", type=int, default=0)
+    parser.add_argument("--seed-end", type=int)
+    parser.add_argument("--batch-size", type=int, default=1, help="number of seeds per batch, the base model of a "
+                        "batch is simulated at once")
+    parser.add_argument("--statistics-format", choices=["rows", "series"], default="rows",
+                        help="store the statistics as a row per time step or as a compressed series per simulation")
+    parser.add_argument("--metrics", help="prefix of the metrics files, defaults to the database name")
+    parser.add_argument("--profile", action="store_true", help="time the simulation phases and handlers of the "
+                                                               "workers of this host")
+    parser.add_argument("--profile-every", type=int, help="run the simulations of every n-th seed under cProfile")
+    parser.add_argument("--profile-slower-than", type=float,
+                        help="keep stack samples of simulations taking longer than this many seconds")
+    parser.add_argument("--profile-directory", default="simulations/profiles",
+                        help="directory of the profile dumps of the workers of this host")
+    arguments = parser.parse_args()
+    if arguments.profile:
+        profiler.enable()
+    authkey = arguments.authkey if arguments.authkey else os.environ.get("REV_AUTHKEY")
+    if not authkey:
+        if arguments.connect or arguments.host not in local_hosts:
+            parser.error("--authkey or REV_AUTHKEY is required to work for a coordinator or to listen beyond "
+                         "localhost")
+        # only the local workers started below connect, they inherit the key
+        authkey = os.urandom(16).hex()
+    authkey = authkey.encode()
+
+    profiling = None
+    if arguments.profile_every is not None or arguments.profile_slower_than is not None:
+        profiling = SimulationProfiling(arguments.profile_directory, arguments.profile_every,
+                                        arguments.profile_slower_than)
+
+    if arguments.connect:
+        host, port = arguments.connect.rsplit(":", 1)
+        workers = [Process(target=run_worker, args=((host, int(port)), authkey, None, None, profiling))
+                   for i in range(arguments.processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    else:
+        database_name = arguments.database if arguments.database else default_database_name()
+        storage = create_storage(arguments.storage, database_name, arguments.statistics_format)
+        signal(SIGINT, coordinator_sigint_handler)
+        seed_end = arguments.seed_end
+        if seed_end is None and arguments.count is not None:
+            seed_end = arguments.seed_start + arguments.count
+        seeds = resume_seeds(campaign_seeds(arguments.seed_start, seed_end), storage.read_journal())
+        metrics_prefix = arguments.metrics if arguments.metrics else os.path.splitext(database_name)[0]
+        metrics_collector = MetricsCollector(metrics_prefix + '.prom', metrics_prefix + '.jsonl')
+        coordinator = Coordinator((arguments.host, arguments.port), authkey, seeds, storage, arguments.batch_size,
+                                  metrics_collector=metrics_collector)
+        if profiling is not None:
+            # the dumps of the local workers are kept next to the results database
+            profiling.directory = os.path.splitext(database_name)[0] + ".profiles"
+        local_workers = [Process(target=run_worker, args=((arguments.host, arguments.port), authkey, None, None,
+                                                          profiling))
+                         for i in range(arguments.local_workers)]
+        for worker in local_workers:
+            worker.start()
+        coordinator.run(lambda: stopped)
+        for worker in local_workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        print(f"\nTotal Simulations: {sum(coordinator.counts)}")
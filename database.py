@@ -1,13 +1,19 @@
 from simulation_objects import RuleFunction, RuleFunctionElement, State
 from base_model import ParameterCategories, SimulationParameters
-from error_model import Statistics
+from error_model import Statistics, StatisticsSummary
+from fault_classification import ControlFaultClassification
+from campaign import CampaignJournalEntry, create_journal_index
+from columnar_statistics import create_series_table, insert_series
 from datetime import datetime
 from delay_functions import DelayTypes
 
+import operator
 import os
 import typing
 import sqlite3
-import sys
+
+def _is_list(type) -> bool:
+    return hasattr(type, '_name') and type._name == 'List' or hasattr(type, "_gorg") and type._gorg == typing.List
 
 def create_table(table_name: str, cls=None, type=None, reference=None,):
     fields = []
@@ -33,7 +39,7 @@ def create_table(table_name: str, cls=None, type=None, reference=None,):
             fields.append((field_name, 'TEXT'))
         elif type == RuleFunction:
             create_table(sub_table_name+'_elements', type=int, reference=table_name)
-        elif hasattr(type, '_name') and type._name == 'List' or hasattr(type, "_gorg") and type._gorg == typing.List:
+        elif _is_list(type):
             create_table(sub_table_name, type=type.__args__[0], reference=table_name)
         else:
             raise ValueError(f'Unknown type {type}')
@@ -46,79 +52,185 @@ def create_table(table_name: str, cls=None, type=None, reference=None,):
     # print(f"CREATE TABLE IF NOT EXISTS {table_name} ({','.join([f[0]+' '+f[1] for f in fields])})")
     con.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({','.join([f[0]+' '+f[1] for f in fields])})")
 
-def insert_table(table_name: str, cls=None, value=None, reference=None, reference_value=None):
-    fields = []
-
-    if reference:
-        fields.append((reference+'_id', reference_value))
-
-    reference_id=None
-
-    def add_field(field_name, value, sub_table_name):
-        if value.__class__ == int:
-            fields.append((field_name, value))
-        elif value.__class__ == float:
-            fields.append((field_name, value))
-        elif value.__class__ == str:
-            fields.append((field_name, value))
-        elif value.__class__ == bool:
-            fields.append((field_name, value))
-        elif value.__class__ == State:
-            fields.append((field_name, value.int_representation))
-        elif value.__class__ == DelayTypes:
-            fields.append((field_name, value.name))
-        elif value.__class__ == ParameterCategories:
-            fields.append((field_name, value.name))
-        elif value.__class__ == RuleFunctionElement:
-            fields.append((field_name, value.int_representation))
-        elif value.__class__ == RuleFunction:
-            if reference_id:
-                for v in value.elements:
-                    insert_table(sub_table_name+'_elements', value=v, reference=table_name,reference_value=reference_id)
-        elif isinstance(value, list):
-            if reference_id:
-                for v in value:
-                    insert_table(sub_table_name, value=v, reference=table_name, reference_value=reference_id)
+# types stored in a single column and the conversion of their values
+column_conversions = {
+    int: None,
+    float: None,
+    str: None,
+    bool: None,
+    State: lambda value: value.int_representation,
+    RuleFunctionElement: lambda value: value.int_representation,
+    DelayTypes: lambda value: value.name,
+    ParameterCategories: lambda value: value.name,
+}
+
+class InsertPlan:
+    """
+    Compiled insert of a class into a table: the INSERT statement, the extractors of the column values and the
+    child tables filled from list and rule function fields. Plans are compiled once per table and class
+    """
+    table_name: str
+    reference: str
+    sql: str
+    extractors: typing.Tuple[typing.Callable, ...]
+    children: typing.Tuple[typing.Tuple[typing.Callable, str], ...] # (extractor of the child values, child table)
+
+    def __init__(self, table_name: str, type, reference=None, value=False):
+        self.table_name = table_name
+        self.reference = reference
+        columns = []
+        extractors = []
+        children = []
+
+        if reference:
+            columns.append(reference+'_id')
+
+        def add_field(field_name, extract, type, sub_table_name):
+            if type in column_conversions:
+                columns.append(field_name)
+                convert = column_conversions[type]
+                extractors.append(extract if convert is None else lambda instance: convert(extract(instance)))
+            elif type == RuleFunction:
+                children.append((lambda instance: extract(instance).elements, sub_table_name+'_elements'))
+            elif type == list or _is_list(type):
+                children.append((extract, sub_table_name))
+            else:
+                raise ValueError(f'Unknown type {type}')
+        if value:
+            add_field('value', lambda instance: instance, type, table_name)
         else:
-            raise ValueError(f'Unknown type {value.__class__}')
-    if cls:
-        for field, value in cls.__class__.__annotations__.items():
-            add_field(field, getattr(cls, field), field)
-    elif value:
-        add_field('value', value, table_name)
-
-    reference_id=con.execute(f"INSERT INTO {table_name}({','.join([f[0] for f in fields])}) VALUES ({','.join(['?' for f in fields])})",[f[1] for f in fields]).lastrowid
+            for field, field_type in type.__annotations__.items():
+                add_field(field, operator.attrgetter(field), field_type, field)
+
+        self.sql = f"INSERT INTO {table_name}({','.join(columns)}) VALUES ({','.join(['?' for c in columns])})"
+        self.extractors = tuple(extractors)
+        self.children = tuple(children)
+
+    def row(self, instance, reference_value=None) -> list:
+        row = [extract(instance) for extract in self.extractors]
+        if self.reference:
+            row.insert(0, reference_value)
+        return row
+
+    def insert(self, instance, reference_value=None) -> int:
+        reference_id = con.execute(self.sql, self.row(instance, reference_value)).lastrowid
+        for extract, child_table_name in self.children:
+            values = extract(instance)
+            if values:
+                insert_plan(child_table_name, values[0].__class__, self.table_name, value=True) \
+                    .insert_many(values, reference_id)
+        return reference_id
+
+    def insert_many(self, instances, reference_value=None):
+        if self.children:
+            # the ids of the rows are needed for the child tables
+            for instance in instances:
+                self.insert(instance, reference_value)
+        else:
+            con.executemany(self.sql, [self.row(instance, reference_value) for instance in instances])
 
-    if cls:
-        for field, value in cls.__class__.__annotations__.items():
-            add_field(field, getattr(cls, field), field)
-    elif value:
-        add_field('value', value, table_name)
+__insert_plans = dict()
 
-    return reference_id
+def insert_plan(table_name: str, type, reference=None, value=False) -> InsertPlan:
+    key = (table_name, type, reference, value)
+    plan = __insert_plans.get(key)
+    if plan is None:
+        plan = InsertPlan(table_name, type, reference, value)
+        __insert_plans[key] = plan
+    return plan
 
-def write_statistics(prefix, env, simulation_reference):
-    for statistic in env.token_statistics:
-        insert_table(prefix+'token_statistics', cls=statistic, reference='simulation', reference_value=simulation_reference)
-    for statistic in env.timestamp_statistics:
-        insert_table(prefix+'timestamp_statistics', cls=statistic, reference='simulation', reference_value=simulation_reference)
-    for statistic in env.full_state_statistics:
-        insert_table(prefix+'full_state_statistics', cls=statistic, reference='simulation', reference_value=simulation_reference)
+def insert_table(table_name: str, cls=None, value=None, reference=None, reference_value=None):
+    if cls is not None:
+        return insert_plan(table_name, cls.__class__, reference).insert(cls, reference_value)
+    return insert_plan(table_name, value.__class__, reference, value=True).insert(value, reference_value)
+
+def insert_many(table_name: str, instances, reference=None, reference_value=None):
+    """
+    Inserts instances of the same class, rows without child tables are inserted with a single executemany
+    """
+    if not instances:
+        return
+    insert_plan(table_name, instances[0].__class__, reference).insert_many(instances, reference_value)
+
+def write_statistics(prefix, env, simulation_reference, statistics_format='rows'):
+    """
+    'rows' stores a row per time step in the statistics tables, 'series' a compressed series per simulation
+    in the statistics_series table (see columnar_statistics)
+    """
+    if statistics_format == 'series':
+        insert_series(con, prefix+'token_statistics', env.token_statistics, simulation_reference)
+        insert_series(con, prefix+'timestamp_statistics', env.timestamp_statistics, simulation_reference)
+        insert_series(con, prefix+'full_state_statistics', env.full_state_statistics, simulation_reference)
+        return
+    insert_many(prefix+'token_statistics', env.token_statistics, reference='simulation', reference_value=simulation_reference)
+    insert_many(prefix+'timestamp_statistics', env.timestamp_statistics, reference='simulation', reference_value=simulation_reference)
+    insert_many(prefix+'full_state_statistics', env.full_state_statistics, reference='simulation', reference_value=simulation_reference)
+
+def write_summaries(prefix, summaries, simulation_reference):
+    for summary in summaries:
+        summary.fault_model = prefix.rstrip('_')
+        insert_table('simulation_summary', cls=summary, reference='simulation', reference_value=simulation_reference)
+
+def write_classifications(classifications, simulation_reference):
+    for classification in classifications:
+        insert_table('control_fault_classification', cls=classification, reference='simulation', reference_value=simulation_reference)
+
+def journal_started(seed):
+    """
+    Journals a campaign seed as in flight. It stays in flight until its result is written
+    """
+    con.execute("INSERT OR IGNORE INTO campaign_journal(seed, completed) VALUES (?, 0)", [seed])
+
+def journal_completed(seed, simulation_reference, cell=None):
+    """
+    Journals a campaign seed as completed. It is committed in the same transaction as the result of the seed.
+    cell is the cell the adaptive sampler drew for the seed
+    """
+    con.execute("UPDATE campaign_journal SET completed = 1, simulation_id = ?, cell = ? WHERE seed = ?",
+                [simulation_reference, cell, seed])
+    if con.execute("SELECT changes()").fetchone()[0] == 0:
+        entry = CampaignJournalEntry()
+        entry.seed = seed
+        entry.completed = True
+        entry.cell = cell
+        insert_table('campaign_journal', cls=entry, reference='simulation', reference_value=simulation_reference)
 
 def commit():
     con.commit()
 
-if not os.path.exists("simulations"):
-    os.mkdir("simulations")
-database_name='simulations/simulation'+datetime.now().strftime("%Y%m%d%H%M")+'.db'
-if len(sys.argv)>=2:
-    database_name=sys.argv[1]
-con = sqlite3.connect(database_name)
-
-create_table('simulation', cls=SimulationParameters)
-create_table('control_full_state_statistics', cls=Statistics, reference='simulation')
-create_table('control_timestamp_statistics', cls=Statistics, reference='simulation')
-create_table('control_token_statistics', cls=Statistics, reference='simulation')
-create_table('infrastructure_full_state_statistics', cls=Statistics, reference='simulation')
-create_table('infrastructure_timestamp_statistics', cls=Statistics, reference='simulation')
-create_table('infrastructure_token_statistics', cls=Statistics, reference='simulation')
+def default_database_name() -> str:
+    if not os.path.exists("simulations"):
+        os.mkdir("simulations")
+    return 'simulations/simulation'+datetime.now().strftime("%Y%m%d%H%M")+'.db'
+
+def connect(name: str):
+    """
+    Opens the database connection of this process and creates the missing tables. The connection is not opened
+    at import, forked processes open their own connection before they access the database.
+    WAL lets the readers (evaluation, adaptive sampling) run concurrently to the writer, and with synchronous=NORMAL
+    a commit does not wait for the disk, a power loss can only lose the last transactions
+    """
+    global con
+    con = sqlite3.connect(name)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("PRAGMA cache_size=-65536") # 64 MiB
+    con.execute("PRAGMA temp_store=MEMORY")
+    create_tables()
+
+def create_tables():
+    create_table('simulation', cls=SimulationParameters)
+    create_table('control_full_state_statistics', cls=Statistics, reference='simulation')
+    create_table('control_timestamp_statistics', cls=Statistics, reference='simulation')
+    create_table('control_token_statistics', cls=Statistics, reference='simulation')
+    create_table('infrastructure_full_state_statistics', cls=Statistics, reference='simulation')
+    create_table('infrastructure_timestamp_statistics', cls=Statistics, reference='simulation')
+    create_table('infrastructure_token_statistics', cls=Statistics, reference='simulation')
+    create_table('control_fault_classification', cls=ControlFaultClassification, reference='simulation')
+    create_table('campaign_journal', cls=CampaignJournalEntry, reference='simulation')
+    create_journal_index(con)
+    create_table('simulation_summary', cls=StatisticsSummary, reference='simulation')
+    create_series_table(con)
+
+con = None
+
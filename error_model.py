@@ -13,6 +13,53 @@ class Statistics:
     band_width_used: int = 0
     memory_used: int = 0
 
+class StatisticsSummary:
+    """
+    Aggregates of the statistics of an algorithm, maintained while the simulation runs.
+    Consecutive time steps with a detected error are stored as one detection interval [start, end]
+    """
+    fault_model: str = '' # control or infrastructure
+    algorithm: str = ''
+    time_steps: int = 0
+    detection_count: int = 0
+    first_detection_time: int = None
+    first_fault_time: int = None # first time step the error node was in the fault space
+    band_width_used_sum: int = 0
+    band_width_used_min: int = 0
+    band_width_used_max: int = 0
+    memory_used_sum: int = 0
+    memory_used_min: int = 0
+    memory_used_max: int = 0
+    detection_starts: List[int]
+    detection_ends: List[int]
+
+    def __init__(self, algorithm: str = ''):
+        self.algorithm = algorithm
+        self.detection_starts = []
+        self.detection_ends = []
+
+    def add(self, statistics: Statistics):
+        if self.time_steps == 0:
+            self.band_width_used_min = self.band_width_used_max = statistics.band_width_used
+            self.memory_used_min = self.memory_used_max = statistics.memory_used
+        else:
+            self.band_width_used_min = min(self.band_width_used_min, statistics.band_width_used)
+            self.band_width_used_max = max(self.band_width_used_max, statistics.band_width_used)
+            self.memory_used_min = min(self.memory_used_min, statistics.memory_used)
+            self.memory_used_max = max(self.memory_used_max, statistics.memory_used)
+        self.time_steps += 1
+        self.band_width_used_sum += statistics.band_width_used
+        self.memory_used_sum += statistics.memory_used
+        if statistics.error_detected:
+            self.detection_count += 1
+            if self.first_detection_time is None:
+                self.first_detection_time = statistics.time
+            if self.detection_ends and self.detection_ends[-1] == statistics.time - 1:
+                self.detection_ends[-1] = statistics.time
+            else:
+                self.detection_starts.append(statistics.time)
+                self.detection_ends.append(statistics.time)
+
 @dataclass
 class Delay:
     from_node: int
@@ -78,6 +125,11 @@ class ErrorSimulationModel(DistributedModelSimulationEnvironment):
     token_statistics: List[Statistics]
     token_statistics_active_time_step: Statistics
 
+    full_state_summary: StatisticsSummary
+    timestamp_summary: StatisticsSummary
+    token_summary: StatisticsSummary
+    first_fault_time: int
+
     def __init__(self, parameters: SimulationParameters, fault_space: Set[int] = None):
 
         super().__init__(parameters)
@@ -105,6 +157,11 @@ class ErrorSimulationModel(DistributedModelSimulationEnvironment):
         self.token_statistics_active_time_step = Statistics()
         self.token_statistics_active_time_step.time = self.time
 
+        self.full_state_summary = StatisticsSummary('full_state')
+        self.timestamp_summary = StatisticsSummary('timestamp')
+        self.token_summary = StatisticsSummary('token')
+        self.first_fault_time = None
+
     def create_node_hook(self, *args, **kwargs):
         return ErrorNode(*args, **kwargs)
 
@@ -210,6 +267,11 @@ class ErrorSimulationModel(DistributedModelSimulationEnvironment):
         if all(error_check):
             self.full_state_statistics_active_time_step.error_detected = True
 
+        if self.first_fault_time is None and error_node.local_state.int_representation in self.fault_space:
+            self.first_fault_time = time
+            for summary in self.summaries():
+                summary.first_fault_time = time
+
         # Timestamp Error Check
         for i in range(len(error_node.timestamp_faults)):
             error_node.timestamp_faults[i] -= 1
@@ -252,6 +314,7 @@ class ErrorSimulationModel(DistributedModelSimulationEnvironment):
         # variables + full states
         self.full_state_statistics_active_time_step.memory_used = self.number_of_variables * (len(error_node.full_state) + 1)
         self.full_state_statistics.append(self.full_state_statistics_active_time_step)
+        self.full_state_summary.add(self.full_state_statistics_active_time_step)
         self.full_state_statistics_active_time_step = Statistics()
 
         self.timestamp_statistics_active_time_step.time = time
@@ -260,6 +323,7 @@ class ErrorSimulationModel(DistributedModelSimulationEnvironment):
         self.timestamp_statistics_active_time_step.memory_used += 32 * len(self.nodes) * len(self.nodes)
         self.timestamp_statistics_active_time_step.memory_used += 32 * len(error_node.timestamp_faults)
         self.timestamp_statistics.append(self.timestamp_statistics_active_time_step)
+        self.timestamp_summary.add(self.timestamp_statistics_active_time_step)
         self.timestamp_statistics_active_time_step = Statistics()
 
         self.token_statistics_active_time_step.time = time
@@ -267,4 +331,8 @@ class ErrorSimulationModel(DistributedModelSimulationEnvironment):
         self.token_statistics_active_time_step.memory_used = self.number_of_variables + 32
         self.token_statistics_active_time_step.memory_used += (32 + len(self.nodes)) * len(error_node.token_faults)
         self.token_statistics.append(self.token_statistics_active_time_step)
-        self.token_statistics_active_time_step = Statistics()
\ No newline at end of file
+        self.token_summary.add(self.token_statistics_active_time_step)
+        self.token_statistics_active_time_step = Statistics()
+
+    def summaries(self) -> List[StatisticsSummary]:
+        return [self.full_state_summary, self.timestamp_summary, self.token_summary]
@@ -1,12 +1,18 @@
-from typing import Any
+from typing import Any, Dict, List
+from multiprocessing import Pool
 import pandas as pd
 import numpy as np
 import sqlite3
+import argparse
 import os
-import dataframe_image
 
 from pandas.core.frame import DataFrame
 from enum import Enum
+from evaluation_cache import EvaluationCache
+from report_rendering import render_curve, render_table, table_formats
+from merge_databases import create_indexes
+from statistics_aggregates import add_detections_per_time, fetch_detection_times, fetch_detections_per_time, \
+    fetch_simulation_aggregates, fetch_simulation_parameters
 
 class Algorithms(Enum):
     FULL_STATE = 0
@@ -19,84 +25,120 @@ class Algorithms(Enum):
             ret.append(word.capitalize())
         return " ".join(ret)
 
-def fetch_table(db_name, table_name) -> DataFrame:
-    db_conn = sqlite3.connect(db_name)
-    df = pd.read_sql_query(f"SELECT * FROM {table_name}", db_conn)
-    db_conn.commit()
-    db_conn.close()
-    return df
-
 control_prefix = "control_"
 infrastructure_prefix = "infrastructure_"
 statistics_suffix = "_statistics"
 
+def database_path(db_name) -> str:
+    # db_name is the name of a database in simulations or the path of a database, e.g. a merged one
+    return os.path.abspath(db_name if os.path.isfile(db_name) else f"simulations/{db_name}")
+
+class DatabaseTables:
+    """
+    Tables of a database shared by the evaluations of all algorithms, they are loaded once per database.
+    With a cache the tables and aggregates are kept on disk and only the simulations added since are read
+    """
+    db_full_name: str
+    simulation_table: DataFrame # simulation parameters including the number of variables
+    cache: EvaluationCache
+    cache_key: list # the database key of the cache, taken before last_id
+    last_id: int # the highest simulation id covered by the tables
+
+    def __init__(self, db_name: str, cache: EvaluationCache = None):
+        self.db_full_name = database_path(db_name)
+        self.cache = cache
+        # a simulation written after the key is taken is covered by the entries or folded in by the next load
+        self.cache_key = cache.key() if cache is not None else None
+        db_conn = sqlite3.connect(self.db_full_name)
+        self.last_id = db_conn.execute("SELECT COALESCE(MAX(id), 0) FROM simulation").fetchone()[0]
+        db_conn.close()
+        self.simulation_table = self._load("simulation", concat_tables, fetch_simulation_parameters)
+
+    def _load(self, name: str, fold, fetch, *arguments):
+        def compute(id_range):
+            db_conn = sqlite3.connect(self.db_full_name)
+            table = fetch(db_conn, *arguments, id_range=id_range)
+            db_conn.close()
+            return table
+        if self.cache is None:
+            return compute((0, self.last_id))
+        return self.cache.load(name, self.last_id, compute, fold, self.cache_key)
+
+    def aggregates(self, prefix: str, algorithm: Algorithms) -> DataFrame:
+        return self._load(prefix + algorithm.name.lower() + "_aggregates", concat_tables, fetch_simulation_aggregates,
+                          prefix, algorithm.name.lower())
+
+    def detection_times(self, prefix: str, algorithm: Algorithms) -> DataFrame:
+        return self._load(prefix + algorithm.name.lower() + "_detection_times", concat_tables, fetch_detection_times,
+                          prefix, algorithm.name.lower())
+
+    def detections_per_time(self, prefix: str, algorithm: Algorithms) -> DataFrame:
+        return self._load(prefix + algorithm.name.lower() + "_detections", add_detections_per_time,
+                          fetch_detections_per_time, prefix, algorithm.name.lower())
+
+def concat_tables(table: DataFrame, other: DataFrame) -> DataFrame:
+    # an empty table has no column types
+    if table.empty or other.empty:
+        return other if table.empty else table
+    return pd.concat([table, other], ignore_index=True)
+
 class SimulationData:
+    """
+    Reports of an algorithm. The statistics are aggregated per simulation by SQL or read from the summaries
+    written during the run, so the statistics tables are never loaded as a whole
+    """
 
     db_name: str
     db_full_name: str
     algorithm: Algorithms
-    number_of_variables_per_node_table: DataFrame
     simulation_table: DataFrame
-    control_table: DataFrame
+    control_table: DataFrame # per simulation aggregates, see statistics_aggregates
     infrastructure_table: DataFrame
-
-    def __init__(self, db_name: str, algorithm: Algorithms):
-        self.db_name = db_name.replace(".db", "")
-        if not os.path.exists(f"figures/{self.db_name}"):
-            os.mkdir(f"figures/{self.db_name}")
-        self.db_full_name = os.path.abspath(f"simulations/{db_name}")
+    table_format: str # png, html or csv, see report_rendering
+
+    def __init__(self, db_name: str, algorithm: Algorithms, tables: DatabaseTables = None, table_format: str = "png"):
+        self.db_name = os.path.basename(db_name).replace(".db", "")
+        os.makedirs(f"figures/{self.db_name}", exist_ok=True)
+        if tables is None:
+            tables = DatabaseTables(db_name)
+        self.db_full_name = tables.db_full_name
+        self.tables = tables
         self.algorithm = algorithm
-        self.number_of_variables_per_node_table = fetch_table(self.db_full_name, "number_of_variables_per_node")
-        self.simulation_table = fetch_table(self.db_full_name, "simulation")
-        self.control_table = fetch_table(self.db_full_name, control_prefix + algorithm.name.lower() + statistics_suffix)
-        self.infrastructure_table = fetch_table(self.db_full_name, infrastructure_prefix + algorithm.name.lower() + statistics_suffix)
-
-    def _build_number_statistics_tables(self, table, varname, param_name, values):
-        data_control = []
-        data_infrastructure = []
-
-        for value in sorted(values):
-            simulation_ids = table.index[table[param_name] == value]
-            table_control = self.control_table[self.control_table["simulation_id"].isin(simulation_ids)]
-            data_control.append({param_name: value, "min": table_control[varname].min(), 
-                    "max": table_control[varname].max(), "avg": table_control[varname].mean()})
-            table_infrastructure = self.infrastructure_table[self.infrastructure_table["simulation_id"].isin(simulation_ids)]
-            data_infrastructure.append({param_name: value, "min": table_infrastructure[varname].min(), 
-                    "max": table_infrastructure[varname].max(), "avg": table_infrastructure[varname].mean()})
-
-        table_control = pd.DataFrame(data_control)
-        table_infrastructure = pd.DataFrame(data_infrastructure)
-
-        return {"control":table_control, "infrastructure":table_infrastructure}
+        self.table_format = table_format
+        self.simulation_table = tables.simulation_table
+        self.control_table = tables.aggregates(control_prefix, algorithm)
+        self.infrastructure_table = tables.aggregates(infrastructure_prefix, algorithm)
+
+    def _build_number_statistics_tables(self, varname, param_name):
+        def aggregate(table):
+            # one row per parameter value, the average is over all time steps of its simulations
+            joined = table.merge(self.simulation_table[["id", param_name]], left_on="simulation_id", right_on="id")
+            grouped = joined.groupby(param_name, sort=True).agg(
+                min=(varname + "_min", "min"), max=(varname + "_max", "max"),
+                sum=(varname + "_sum", "sum"), time_steps=("time_steps", "sum"))
+            grouped["avg"] = grouped["sum"] / grouped["time_steps"]
+            return grouped[["min", "max", "avg"]].reset_index()
+
+        return {"control": aggregate(self.control_table), "infrastructure": aggregate(self.infrastructure_table)}
 
     def _generate_number_statistics_graphics(self, fname, tables, param_name):
-        if not os.path.exists(f"figures/{self.db_name}/{fname}"):
-            os.mkdir(f"figures/{self.db_name}/{fname}")
+        os.makedirs(f"figures/{self.db_name}/{fname}", exist_ok=True)
         for table_key in tables.keys():
             table_name = table_key.capitalize()
             base_folder_name = f"figures/{self.db_name}/{fname}/{table_name}"
             folder_name = base_folder_name + "/" + param_name
-            if not os.path.exists(base_folder_name):
-                os.mkdir(base_folder_name)
-            if not os.path.exists(folder_name):
-                os.mkdir(folder_name)
-            file_name = folder_name + "/" + self.algorithm.capitalized_name() + f" {fname} {table_name} {param_name}.png"
-            styled_table = tables[table_key].style.format("{:.0f}").hide_index().set_properties(**{'text-align': 'center'})
-            styled_table.set_table_styles([dict(selector='th', props=[('text-align', 'center')])])
-            dataframe_image.export(styled_table, file_name)
+            os.makedirs(base_folder_name, exist_ok=True)
+            os.makedirs(folder_name, exist_ok=True)
+            file_name = folder_name + "/" + self.algorithm.capitalized_name() + f" {fname} {table_name} {param_name}"
+            render_table(tables[table_key], file_name, "{:.0f}", self.table_format)
 
     def _generate_number_statistics_tables(self, varname, fname): # varname should be band_width_used or memory_used
         # Tables for number_of_nodes
-        number_of_nodes_values = self.simulation_table["number_of_nodes"].unique()
-        temp_table = self.simulation_table.set_index("id")
-        tables = self._build_number_statistics_tables(self.simulation_table, varname, "number_of_nodes", number_of_nodes_values)
-        self._generate_number_statistics_graphics(fname, tables, "Nodes")        
+        tables = self._build_number_statistics_tables(varname, "number_of_nodes")
+        self._generate_number_statistics_graphics(fname, tables, "Nodes")
 
         # Tables for number_of_variables
-        temp_table = self.number_of_variables_per_node_table.groupby(["simulation_id"]).agg({"value":"sum"})
-        number_of_variables_values = temp_table["value"].unique()
-        temp_table.rename(columns={"value":"number_of_variables"}, inplace=True)
-        tables = self._build_number_statistics_tables(temp_table, varname, "number_of_variables", number_of_variables_values)
+        tables = self._build_number_statistics_tables(varname, "number_of_variables")
         self._generate_number_statistics_graphics(fname, tables, "Variables")
 
     def generate_bandwidth_statistics_tables(self):
@@ -107,18 +149,16 @@ class SimulationData:
 
     def _generate_rate_graphics(self, table, rate_name):
         folder_name = f"figures/{self.db_name}/{rate_name}"
-        if not os.path.exists(folder_name):
-            os.mkdir(folder_name)
-        file_name = folder_name + "/" + self.algorithm.capitalized_name() + f" {rate_name}.png"
-        styled_table = table.style.format("{:.2f}%").hide_index().set_properties(**{'text-align': 'center'})
-        styled_table.set_table_styles([dict(selector='th', props=[('text-align', 'center')])])
-        dataframe_image.export(styled_table, file_name)
+        os.makedirs(folder_name, exist_ok=True)
+        file_name = folder_name + "/" + self.algorithm.capitalized_name() + f" {rate_name}"
+        render_table(table, file_name, "{:.2f}%", self.table_format)
 
     def generate_false_negative_rates_tables(self): # TODO: maybe add time component and merge with false positive maybe?
         good_simulation_ids = self.simulation_table["id"][self.simulation_table["category"] == "GOOD"]
         bad_simulation_ids = self.simulation_table["id"][self.simulation_table["category"] == "BAD"]
 
-        table = self.control_table.groupby(["simulation_id"]).agg({"error_detected":"sum"})
+        table = self.control_table.set_index("simulation_id")[["detection_count"]] \
+            .rename(columns={"detection_count": "error_detected"})
         table_good = table.loc[good_simulation_ids]
         table_bad = table.loc[bad_simulation_ids]
 
@@ -136,7 +176,8 @@ class SimulationData:
         good_simulation_ids = self.simulation_table["id"][self.simulation_table["category"] == "GOOD"]
         bad_simulation_ids = self.simulation_table["id"][self.simulation_table["category"] == "BAD"]
 
-        table = self.infrastructure_table.groupby(["simulation_id"]).agg({"error_detected":"sum"})
+        table = self.infrastructure_table.set_index("simulation_id")[["detection_count"]] \
+            .rename(columns={"detection_count": "error_detected"})
         table_good = table.loc[good_simulation_ids]
         table_bad = table.loc[bad_simulation_ids]
 
@@ -150,44 +191,112 @@ class SimulationData:
 
         return table
 
+    def generate_detection_delay_tables(self):
+        tables = detection_delay_statistics(self.tables.detection_times(control_prefix, self.algorithm),
+                                            self.simulation_table)
+        folder_name = f"figures/{self.db_name}/Detection Delay"
+        os.makedirs(folder_name, exist_ok=True)
+        for param_name, table in tables.items():
+            file_name = folder_name + "/" + self.algorithm.capitalized_name() + f" Detection Delay {param_name}"
+            render_table(table, file_name, "{:.1f}", self.table_format)
+        return tables
+
     def generate_error_curves(self):
-        if not os.path.exists(f"figures/{self.db_name}/Error Curves"):
-            os.mkdir(f"figures/{self.db_name}/Error Curves")
+        os.makedirs(f"figures/{self.db_name}/Error Curves", exist_ok=True)
 
-        table = self.control_table.groupby(["time"]).agg({"error_detected":"sum"}).cumsum()
+        table = self.tables.detections_per_time(control_prefix, self.algorithm).cumsum()
         title = self.algorithm.capitalized_name() + " Control Error Curve"
-        plot = table.plot(title=title, xlabel="Time", ylabel="Errors (cumulative)")
-        fig = plot.get_figure()
-        if not os.path.exists(f"figures/{self.db_name}/Error Curves/Control"):
-            os.mkdir(f"figures/{self.db_name}/Error Curves/Control")
-        fig.savefig(f"figures/{self.db_name}/Error Curves/Control/{title}.png")
+        os.makedirs(f"figures/{self.db_name}/Error Curves/Control", exist_ok=True)
+        render_curve(table, f"figures/{self.db_name}/Error Curves/Control/{title}", title, "Time", "Errors (cumulative)")
 
-        table = self.infrastructure_table.groupby(["time"]).agg({"error_detected":"sum"}).cumsum()
+        table = self.tables.detections_per_time(infrastructure_prefix, self.algorithm).cumsum()
         title = self.algorithm.capitalized_name() + " Infrastructure Error Curve"
-        plot = table.plot(title=title, xlabel="Time", ylabel="Errors (cumulative)")
-        fig = plot.get_figure()
-        if not os.path.exists(f"figures/{self.db_name}/Error Curves/Infrastructure"):
-            os.mkdir(f"figures/{self.db_name}/Error Curves/Infrastructure")
-        fig.savefig(f"figures/{self.db_name}/Error Curves/Infrastructure/{title}.png")
+        os.makedirs(f"figures/{self.db_name}/Error Curves/Infrastructure", exist_ok=True)
+        render_curve(table, f"figures/{self.db_name}/Error Curves/Infrastructure/{title}", title, "Time",
+                     "Errors (cumulative)")
 
-def detection_delay_statistics(statistics: DataFrame):
+def detection_delay_statistics(statistics: DataFrame, simulation_table: DataFrame) -> Dict[str, DataFrame]:
     """
-    Returns the Statistics for the Detection Delay
+    Returns the Statistics for the Detection Delay, the time steps from the first time step in the fault space to
+    the first detection, per number of nodes, number of variables and delay type.
+    statistics has the first fault and detection time per simulation, see statistics_aggregates.fetch_detection_times.
+    Simulations that never reached the fault space are left out, undetected faults only count as simulations
     """
-    # TODO
-
-def evaluate_statistics(db_name):
+    faulty = statistics.dropna(subset=["first_fault_time"]) \
+        .merge(simulation_table, left_on="simulation_id", right_on="id")
+    faulty["delay"] = faulty["first_detection_time"].astype(float) - faulty["first_fault_time"].astype(float)
+    tables = dict()
+    for param_name in ["number_of_nodes", "number_of_variables", "delay_type"]:
+        grouped = faulty.groupby(param_name, sort=True)
+        # the count of describe leaves out the undetected faults
+        table = grouped["delay"].describe(percentiles=[0.5, 0.9, 0.99]).rename(columns={"count": "detected"})
+        table.insert(0, "simulations", grouped.size())
+        tables[param_name] = table.reset_index()
+    return tables
+
+# the reports generated for every database and algorithm
+reports = ["generate_false_negative_rates_tables", "generate_false_positive_rates_tables",
+           "generate_bandwidth_statistics_tables", "generate_memory_statistics_tables", "generate_detection_delay_tables",
+           "generate_error_curves"]
+
+def evaluate_statistics(db_name, table_format: str = "png"):
+    db_conn = sqlite3.connect(database_path(db_name))
+    create_indexes(db_conn)
+    db_conn.close()
+    tables = DatabaseTables(db_name)
     for algorithm in Algorithms:
-        simulation_data = SimulationData(db_name, algorithm)
-        simulation_data.generate_false_negative_rates_tables()
-        simulation_data.generate_false_positive_rates_tables()
-        simulation_data.generate_bandwidth_statistics_tables()
-        simulation_data.generate_memory_statistics_tables()
-        simulation_data.generate_error_curves()
-
-
-if not os.path.exists("figures"):
-    os.mkdir("figures")
-
-for db in os.listdir("simulations"):
-    evaluate_statistics(db)
\ No newline at end of file
+        simulation_data = SimulationData(db_name, algorithm, tables, table_format)
+        for report in reports:
+            getattr(simulation_data, report)()
+
+def database_cache(db_name) -> EvaluationCache:
+    return EvaluationCache(database_path(db_name), f"figures/{os.path.basename(db_name).replace('.db', '')}/.cache")
+
+def _aggregate_job(job):
+    db_name, algorithm = job
+    tables = DatabaseTables(db_name, database_cache(db_name))
+    for prefix in [control_prefix, infrastructure_prefix]:
+        tables.aggregates(prefix, algorithm)
+        tables.detections_per_time(prefix, algorithm)
+    tables.detection_times(control_prefix, algorithm)
+
+def _report_job(job):
+    db_name, algorithm, report, table_format = job
+    cache = database_cache(db_name)
+    key = cache.key()
+    getattr(SimulationData(db_name, algorithm, DatabaseTables(db_name, cache), table_format), report)()
+    cache.mark_done(f"{algorithm.name.lower()}.{report}.{table_format}", key)
+
+def evaluate_databases(db_names: List[str], processes: int = None, force: bool = False, table_format: str = "png"):
+    """
+    Generates the reports of the databases in a process pool. The aggregates of every database and algorithm are
+    computed first, then the reports are rendered from them in parallel. Reports generated from the current state
+    of their database are skipped unless forced
+    """
+    report_jobs = []
+    for db_name in db_names:
+        db_conn = sqlite3.connect(database_path(db_name))
+        create_indexes(db_conn)
+        db_conn.close()
+        cache = database_cache(db_name)
+        # the shared simulation table is cached before the jobs of the database run
+        DatabaseTables(db_name, cache)
+        report_jobs += [(db_name, algorithm, report, table_format) for algorithm in Algorithms for report in reports
+                        if force or not cache.is_done(f"{algorithm.name.lower()}.{report}.{table_format}")]
+    aggregate_jobs = list(dict.fromkeys((db_name, algorithm) for db_name, algorithm, _, _ in report_jobs))
+    with Pool(processes) as pool:
+        pool.map(_aggregate_job, aggregate_jobs)
+        pool.map(_report_job, report_jobs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates the reports of result databases")
+    parser.add_argument("databases", nargs="*", help="databases in simulations or paths, all databases in "
+                                                      "simulations by default")
+    parser.add_argument("--processes", type=int, help="number of evaluation processes, one per CPU by default")
+    parser.add_argument("--force", action="store_true", help="regenerate reports of unchanged databases")
+    parser.add_argument("--table-format", choices=table_formats, default="png", help="file format of the tables")
+    arguments = parser.parse_args()
+    os.makedirs("figures", exist_ok=True)
+
+    db_names = arguments.databases or [db for db in os.listdir("simulations") if db.endswith(".db")]
+    evaluate_databases(db_names, arguments.processes, arguments.force, arguments.table_format)
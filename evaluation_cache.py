@@ -0,0 +1,76 @@
+from typing import Callable, List, Tuple
+
+import json
+import os
+import pickle
+
+class EvaluationCache:
+    """
+    On-disk cache of the intermediate aggregates and finished reports of the evaluation of a database.
+    Entries are keyed by the modification time and size of the database file and its write-ahead log, so they are
+    updated after the database changed, e.g. by a campaign appending to it or a merge
+    """
+    db_full_name: str
+    directory: str
+
+    def __init__(self, db_full_name: str, directory: str):
+        self.db_full_name = db_full_name
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self) -> List[int]:
+        key = []
+        for file_name in [self.db_full_name, self.db_full_name + "-wal"]:
+            if os.path.exists(file_name):
+                stat = os.stat(file_name)
+                key += [stat.st_mtime_ns, stat.st_size]
+        return key
+
+    def _write(self, file_name: str, data: bytes):
+        # jobs of other processes never read a partially written entry
+        temporary_file = f"{file_name}.{os.getpid()}.tmp"
+        with open(temporary_file, 'wb') as file:
+            file.write(data)
+        os.replace(temporary_file, file_name)
+
+    def load(self, name: str, last_id: int, fetch: Callable[[Tuple[int, int]], object],
+             fold: Callable[[object, object], object], key: List[int] = None):
+        """
+        Returns the entry for the simulations with ids up to last_id. fetch returns the value of the simulations in
+        an id range (exclusive, inclusive) and fold combines two values.
+        The entry keeps the highest simulation id it covers. After the database changed only the simulations beyond
+        that mark are fetched and folded into the entry, assuming simulations are only appended to a database.
+        key has to be taken before last_id is read, a simulation written in between would be missing from an
+        entry stored under the newer key. By default it is taken now
+        """
+        file_name = os.path.join(self.directory, name + ".pkl")
+        if key is None:
+            key = self.key()
+        if os.path.exists(file_name):
+            with open(file_name, 'rb') as file:
+                cached_key, high_water_mark, value = pickle.load(file)
+            if cached_key == key:
+                return value
+            if high_water_mark <= last_id:
+                value = fold(value, fetch((high_water_mark, last_id)))
+                self._write(file_name, pickle.dumps((key, last_id, value), protocol=pickle.HIGHEST_PROTOCOL))
+                return value
+        value = fetch((0, last_id))
+        self._write(file_name, pickle.dumps((key, last_id, value), protocol=pickle.HIGHEST_PROTOCOL))
+        return value
+
+    def is_done(self, report: str) -> bool:
+        """
+        Returns whether the report was generated from the current database
+        """
+        file_name = os.path.join(self.directory, report + ".done")
+        if not os.path.exists(file_name):
+            return False
+        with open(file_name) as file:
+            return json.load(file) == self.key()
+
+    def mark_done(self, report: str, key: List[int]):
+        """
+        Records that the report was generated from the database with the key taken before generating it
+        """
+        self._write(os.path.join(self.directory, report + ".done"), json.dumps(key).encode())
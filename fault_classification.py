@@ -0,0 +1,51 @@
+from typing import Dict, List, Set, Tuple
+
+class ControlFaultClassification:
+    state: int = 0
+    dwell_time: int = 0
+    detectable: bool = False
+
+def control_fault_dwell_times(state_history: List[Tuple[int, int]], fault_space: Set[int]) -> Dict[int, int]:
+    """
+    Returns for every state of the fault space the longest time the history stayed inside the fault space
+    after reaching that state. States that were never reached have a dwell time of 0.
+    The history is swept once: for every run of consecutive fault space states the run end time is
+    determined and compared with the first occurrence of each state inside the run.
+    """
+    dwell_times = {state: 0 for state in fault_space}
+    last_index = len(state_history) - 1
+    run_first_times: Dict[int, int] = dict()
+
+    def close_run(end_time):
+        for state, first_time in run_first_times.items():
+            if end_time - first_time > dwell_times[state]:
+                dwell_times[state] = end_time - first_time
+        run_first_times.clear()
+
+    for state, time in state_history:
+        if state in fault_space:
+            if state not in run_first_times:
+                run_first_times[state] = time
+        elif run_first_times:
+            # the run ends with the first state outside of the fault space
+            close_run(time)
+    if run_first_times:
+        # a run reaching the end of the history ends with the last entry
+        close_run(state_history[last_index][1])
+
+    return dwell_times
+
+def classify_control_faults(state_history: List[Tuple[int, int]], fault_space: Set[int],
+                            min_delay: int) -> List[ControlFaultClassification]:
+    """
+    Classifies every control fault of the fault space. A control fault is not detectable by token / hard to detect
+    by timestamp if it is resolved in under min_delay*2 timesteps
+    """
+    classifications = []
+    for state, dwell_time in control_fault_dwell_times(state_history, fault_space).items():
+        classification = ControlFaultClassification()
+        classification.state = state
+        classification.dwell_time = dwell_time
+        classification.detectable = dwell_time > 2 * min_delay
+        classifications.append(classification)
+    return classifications
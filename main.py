@@ -1,73 +1,168 @@
-from multiprocessing import Manager, Process, Value, cpu_count
-import random
+from multiprocessing import cpu_count
+import argparse
+import os
 import signal
-from typing import List
 import time
 
-from simulation import start_simulating
-
-random.seed(0)
-
-class SimulationProcess:
-    process: Process
-    seed: int
-    good_simulation_count: Value
-    bad_simulation_count: Value
-    faulty_simulation_count: Value
-    timed_out_simulation_count: Value
+from adaptive_sampler import AdaptiveSampler
+from base_model import ParameterCategories
+from campaign import campaign_seeds, parse_targets, resume_seeds, shard_targets, targets_reached
+from database import default_database_name
+from metrics import MetricsCollector
+from prescreening import PreScreening
+import profiler
+from simulation import max_number_of_nodes, max_number_of_variables_per_node
+from simulation_pool import SimulationPool
+from simulation_profiling import SimulationProfiling
+from storage import create_storage
 
+def print_counts(counts, prefix, end):
+    print(f"{prefix}{counts[ParameterCategories.GOOD.value]} good, {counts[ParameterCategories.BAD.value]} bad, "
+          f"{counts[ParameterCategories.FAULTY.value]} faulty, {counts[ParameterCategories.TIMEOUT.value]} timed out and "
+          f"{counts[ParameterCategories.SKIPPED.value]} skipped", end=end)
 
 stopped = False
 def sigint_handler(signum, frame):
-        global stopped 
+        global stopped
         stopped = True
 
-if __name__ == "__main__":
-    signal.signal(signal.SIGINT, sigint_handler)
+worker_count_change = 0
+def sigusr_handler(signum, frame):
+    # SIGUSR1 adds a worker, SIGUSR2 removes a worker
+    global worker_count_change
+    worker_count_change += 1 if signum == signal.SIGUSR1 else -1
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Runs a simulation campaign. Without --processes the campaign is "
+                                                 "configured interactively and runs until it is stopped.")
+    parser.add_argument("database", nargs="?", help="results database or file, defaults to a timestamped database in simulations")
+    parser.add_argument("--storage", choices=["sqlite", "binary", "null"], default="sqlite",
+                        help="SQLite database, append-only binary file (see storage.py) or no storage at all")
+    parser.add_argument("--processes", type=int, help="number of simulation processes (non-interactive mode)")
+    parser.add_argument("--count", type=int, help="total number of simulations of the campaign (all shards)")
+    parser.add_argument("--targets", type=parse_targets, help="per-category targets of the campaign (all shards), "
+                        "e.g. GOOD=100,BAD=50. Every shard reaches its part, counting the simulations of a resumed "
+                        "run")
+    parser.add_argument("--seed-start", type=int, default=0, help="first simulation seed of the campaign")
+    parser.add_argument("--seed-end", type=int, help="end of the simulation seed range (exclusive)")
+    parser.add_argument("--shard-index", type=int, default=0, help="shard of the campaign simulated by this run")
+    parser.add_argument("--shard-count", type=int, default=1, help="number of shards of the campaign")
+    parser.add_argument("--batch-size", type=int, default=1, help="number of seeds per task, the base model of a "
+                        "batch is simulated at once without --adaptive-width")
+    parser.add_argument("--adaptive-width", type=float, help="target confidence interval width for adaptive sampling. "
+                        "The parameter sets then depend on the results before, the seeds do not reproduce them")
+    parser.add_argument("--audit-fraction", type=float, help="audited fraction of pre-screened parameter sets")
+    parser.add_argument("--statistics-format", choices=["rows", "series"], default="rows",
+                        help="store the statistics as a row per time step or as a compressed series per simulation")
+    parser.add_argument("--metrics", help="prefix of the metrics files, defaults to the database name. "
+                                          "<prefix>.prom is rewritten and <prefix>.jsonl extended every 10 seconds")
+    parser.add_argument("--profile-every", type=int, help="run the simulations of every n-th seed under cProfile, the "
+                                                          "dumps are written to <database>.profiles")
+    parser.add_argument("--profile-slower-than", type=float,
+                        help="keep stack samples of simulations taking longer than this many seconds")
+    parser.add_argument("--profile", action="store_true", help="time the simulation phases and handlers, the "
+                                                               "percentiles are added to the metrics")
+    return parser.parse_args()
+
+def interactive_arguments(arguments):
     simulation_process_count = input(f"\nEnter the desired amount of Processes (max {cpu_count()}): ")
     if not simulation_process_count.isnumeric():
         print(simulation_process_count, "is not a number")
         exit(-1)
-    else:
-        print(f"\nStarting {min(cpu_count(), int(simulation_process_count))} Simulation Processes\n")
-        simulation_process_count = min(cpu_count(), int(simulation_process_count))
-
-    simulation_processes: List[SimulationProcess] = []
-    process_manager = Manager()
-    database_lock = process_manager.Lock()
-
-    for i in range(simulation_process_count):
-        simulation_process = SimulationProcess()
-        simulation_process.seed = random.randint(0,1000000)
-        simulation_process.good_simulation_count = process_manager.Value('I', 0)
-        simulation_process.bad_simulation_count = process_manager.Value('I', 0)
-        simulation_process.faulty_simulation_count = process_manager.Value('I', 0)
-        simulation_process.timed_out_simulation_count = process_manager.Value('I', 0)
-        args = (database_lock, simulation_process.seed, simulation_process.good_simulation_count, simulation_process.bad_simulation_count, 
-                simulation_process.faulty_simulation_count, simulation_process.timed_out_simulation_count)
-        simulation_process.process = Process(target=start_simulating, args=args)
-        simulation_processes.append(simulation_process)
-        simulation_process.process.start()
-
-    while not stopped:
-        good = sum([p.good_simulation_count.value for p in simulation_processes])
-        bad = sum([p.bad_simulation_count.value for p in simulation_processes])
-        faulty = sum([p.faulty_simulation_count.value for p in simulation_processes])
-        timed_out = sum([p.timed_out_simulation_count.value for p in simulation_processes])
-        print(f"\rSimulations: {good} good, {bad} bad, {faulty} faulty and {timed_out} timed out", end="")
-        time.sleep(10)
+    arguments.processes = int(simulation_process_count)
+
+    target_width = input("Enter the desired confidence interval width for adaptive sampling (empty for uniform sampling): ")
+    if target_width:
+        try:
+            arguments.adaptive_width = float(target_width)
+        except ValueError:
+            print(target_width, "is not a number")
+            exit(-1)
+
+    audit_fraction = input("Enter the audited fraction of pre-screened parameter sets (empty to simulate all parameter sets): ")
+    if audit_fraction:
+        try:
+            arguments.audit_fraction = float(audit_fraction)
+        except ValueError:
+            print(audit_fraction, "is not a number")
+            exit(-1)
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    database_name = arguments.database if arguments.database else default_database_name()
+    storage = create_storage(arguments.storage, database_name, arguments.statistics_format)
+
+    signal.signal(signal.SIGINT, sigint_handler)
+    if arguments.processes is None:
+        interactive_arguments(arguments)
+    simulation_process_count = min(cpu_count(), arguments.processes)
+    print(f"\nStarting {simulation_process_count} Simulation Processes\n")
+
+    sampler = None
+    if arguments.adaptive_width is not None:
+        if arguments.storage != "sqlite":
+            print("Adaptive sampling needs the sqlite storage")
+            exit(-1)
+        sampler = AdaptiveSampler(database_name, arguments.adaptive_width, max_number_of_nodes, max_number_of_variables_per_node)
+
+    if arguments.profile:
+        profiler.enable()
+
+    prescreening = None
+    if arguments.audit_fraction is not None:
+        prescreening = PreScreening(arguments.audit_fraction)
+
+    seed_end = arguments.seed_end
+    if seed_end is None and arguments.count is not None:
+        seed_end = arguments.seed_start + arguments.count
+    seeds = campaign_seeds(arguments.seed_start, seed_end, arguments.shard_index, arguments.shard_count)
+    # a campaign continued in the same database skips the completed seeds
+    seeds = resume_seeds(seeds, storage.read_journal())
+    targets = None
+    if arguments.targets:
+        targets = shard_targets(arguments.targets, arguments.shard_index, arguments.shard_count)
+        # the simulations of the earlier runs count towards the targets
+        stored_counts = storage.read_category_counts()
+
+    signal.signal(signal.SIGUSR1, sigusr_handler)
+    signal.signal(signal.SIGUSR2, sigusr_handler)
+
+    profiling = None
+    if arguments.profile_every is not None or arguments.profile_slower_than is not None:
+        profiling = SimulationProfiling(os.path.splitext(database_name)[0] + ".profiles", arguments.profile_every,
+                                        arguments.profile_slower_than)
+
+    simulation_pool = SimulationPool(seeds, storage, batch_size=arguments.batch_size, sampler=sampler, prescreening=prescreening,
+                                     profiling=profiling)
+    simulation_pool.resize(simulation_process_count)
+
+    metrics_prefix = arguments.metrics if arguments.metrics else os.path.splitext(database_name)[0]
+    metrics_collector = MetricsCollector(metrics_prefix + '.prom', metrics_prefix + '.jsonl')
+
+    last_print = 0
+    while not stopped and simulation_pool.alive():
+        if worker_count_change:
+            simulation_pool.resize(simulation_pool.worker_count + worker_count_change)
+            worker_count_change = 0
+        if targets and not simulation_pool.seeds_exhausted and \
+                targets_reached(targets, [stored + count for stored, count in
+                                          zip(stored_counts, simulation_pool.counts())]):
+            print("\n\nAll targets reached, waiting for the running simulations\n")
+            simulation_pool.drain()
+        simulation_pool.rebalance()
+        simulation_pool.feed()
+        metrics_collector.collect(simulation_pool.metrics)
+        if time.time() - last_print >= 10:
+            print_counts(simulation_pool.counts(), "\rSimulations: ", "")
+            metrics_collector.export(simulation_pool.busy_times())
+            last_print = time.time()
+        time.sleep(1)
         if stopped:
             print("\n\nStopping Simulation Processes\n")
 
-    database_lock.acquire()
-    for i in range(simulation_process_count):
-        simulation_processes[i].process.terminate()
-        simulation_processes[i].process.join()
-        print(f"Simulation Process {i} was terminated")
-    database_lock.release()
-
-    good = sum([p.good_simulation_count.value for p in simulation_processes])
-    bad = sum([p.bad_simulation_count.value for p in simulation_processes])
-    faulty = sum([p.faulty_simulation_count.value for p in simulation_processes])
-    timed_out = sum([p.timed_out_simulation_count.value for p in simulation_processes])
-    print(f"\nTotal Simulations: {good} good, {bad} bad, {faulty} faulty and {timed_out} timed out")
\ No newline at end of file
+    simulation_pool.stop()
+    metrics_collector.collect(simulation_pool.metrics)
+    metrics_collector.export()
+    print(f"{len(simulation_pool.workers)} Simulation Processes were terminated")
+
+    print_counts(simulation_pool.counts(), "\nTotal Simulations: ", "\n")
@@ -0,0 +1,93 @@
+from typing import Dict, List
+from campaign import create_journal_index
+
+import argparse
+import sqlite3
+
+def table_columns(connection, table_name: str, schema: str = 'main') -> List[str]:
+    return [row[1] for row in connection.execute(f"PRAGMA {schema}.table_info({table_name})")]
+
+def create_indexes(connection):
+    """
+    Creates the indexes used by the evaluation: the references of every table to its parent table and the time of
+    the statistics tables, and the index of the journal seeds
+    """
+    tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    for table_name in tables:
+        columns = table_columns(connection, table_name)
+        for column in columns:
+            if column.endswith('_id') and column[:-len('_id')] in tables:
+                connection.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_{column} ON {table_name}({column})")
+        if table_name.endswith('_statistics') and 'time' in columns:
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_time ON {table_name}(time)")
+    if 'campaign_journal' in tables:
+        create_journal_index(connection)
+    connection.commit()
+
+def merge_database(connection, source: str):
+    """
+    Appends the tables of the source database to the database of the connection.
+    The ids of every table are shifted behind the ids already in the table and the references to them are shifted
+    by the same offset, so the merged simulations keep their rule functions, statistics and journal entries.
+    A table of the source may lack columns of the target, e.g. when it was written by an older revision, but a
+    source with columns the target does not have is rejected before anything is copied. The source is merged in
+    one transaction, a failed merge leaves the target unchanged
+    """
+    connection.execute("ATTACH DATABASE ? AS source", [source])
+    try:
+        # internal tables like sqlite_stat1 of ANALYZE are not merged
+        source_tables = [row for row in connection.execute(
+            "SELECT name, sql FROM source.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        tables = set(row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'"))
+        for table_name, _ in source_tables:
+            if table_name in tables:
+                missing = set(table_columns(connection, table_name, 'source')) - \
+                    set(table_columns(connection, table_name))
+                if missing:
+                    raise ValueError(f"{source}: table {table_name} has columns missing in the target: "
+                                     f"{', '.join(sorted(missing))}")
+
+        connection.execute("BEGIN")
+        try:
+            offsets: Dict[str, int] = dict()
+            for table_name, sql in source_tables:
+                if table_name not in tables:
+                    connection.execute(sql)
+                offsets[table_name] = connection.execute(
+                    f"SELECT COALESCE(MAX(id), 0) FROM {table_name}").fetchone()[0]
+
+            for table_name, _ in source_tables:
+                columns = table_columns(connection, table_name, 'source')
+                values = []
+                for column in columns:
+                    if column == 'id':
+                        values.append(f"id + {offsets[table_name]}")
+                    elif column.endswith('_id') and column[:-len('_id')] in offsets:
+                        values.append(f"{column} + {offsets[column[:-len('_id')]]}")
+                    else:
+                        values.append(column)
+                connection.execute(f"INSERT INTO {table_name}({','.join(columns)}) SELECT {','.join(values)} "
+                                   f"FROM source.{table_name}")
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+    finally:
+        connection.execute("DETACH DATABASE source")
+
+def merge_databases(target: str, sources: List[str]):
+    connection = sqlite3.connect(target)
+    try:
+        for source in sources:
+            merge_database(connection, source)
+        create_indexes(connection)
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merges the result databases of campaign shards into one database "
+                                                 "and creates the indexes used by the evaluation")
+    parser.add_argument("target", help="merged database, the shards are appended if it exists")
+    parser.add_argument("sources", nargs="+", help="shard databases")
+    arguments = parser.parse_args()
+    merge_databases(arguments.target, arguments.sources)
@@ -0,0 +1,161 @@
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from queue import Empty
+from typing import Deque, Dict, List
+
+import json
+import os
+import time
+
+import profiler
+
+phases = ['base', 'distributed', 'classification', 'control', 'infrastructure', 'db_write']
+# phases running a simulation environment, their ticks are counted for the ticks per second
+simulation_phases = ['base', 'distributed', 'control', 'infrastructure']
+
+@dataclass
+class SimulationMetrics:
+    worker: int = 0
+    seed: int = None
+    finished_at: float = 0
+    phase_times: Dict[str, float] = field(default_factory=dict)
+    ticks: int = 0
+    max_event_queue_depth: int = 0
+    profile: Dict[str, profiler.Histogram] = field(default_factory=dict) # see profiler.take
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Adds the duration of the with block to the phase time
+        """
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter_ns() - start
+            self.phase_times[name] = self.phase_times.get(name, 0) + duration / 1e9
+            if profiler.enabled:
+                profiler.record('phase.' + name, duration)
+
+    def record_run(self, env):
+        self.ticks += env.time
+        self.max_event_queue_depth = max(self.max_event_queue_depth, env.max_event_list_length)
+
+class MetricsCollector:
+    """
+    Aggregates the metrics the workers report for each simulation. The Prometheus text file is rewritten on every
+    export, the JSON lines log gets one snapshot per export.
+    Rates and maxima cover the last window seconds, totals cover the whole campaign.
+    """
+    prometheus_file: str
+    log_file: str
+    window: float
+    recent: Deque[SimulationMetrics]
+    simulation_counts: Dict[int, int]
+    phase_totals: Dict[str, float]
+    profile: Dict[str, profiler.Histogram] # merged profiles of all workers
+
+    def __init__(self, prometheus_file: str, log_file: str, window: float = 60):
+        self.prometheus_file = prometheus_file
+        self.log_file = log_file
+        self.window = window
+        self.started_at = time.time()
+        self.recent = deque()
+        self.simulation_counts = dict()
+        self.phase_totals = {phase: 0 for phase in phases}
+        self.profile = dict()
+
+    def record(self, metrics: SimulationMetrics):
+        self.recent.append(metrics)
+        self.simulation_counts[metrics.worker] = self.simulation_counts.get(metrics.worker, 0) + 1
+        for phase, duration in metrics.phase_times.items():
+            self.phase_totals[phase] = self.phase_totals.get(phase, 0) + duration
+        profiler.merge(self.profile, metrics.profile)
+
+    def collect(self, queue):
+        """
+        Records all metrics waiting in the queue
+        """
+        try:
+            while True:
+                self.record(queue.get_nowait())
+        except Empty:
+            pass
+
+    def snapshot(self, busy_times: Dict[int, float] = None, now: float = None) -> dict:
+        """
+        Returns the current metrics. busy_times are the seconds every worker has been working on its running
+        simulation, a value close to the timeout points to a stalled worker
+        """
+        if now is None:
+            now = time.time()
+        while self.recent and self.recent[0].finished_at < now - self.window:
+            self.recent.popleft()
+        window = min(self.window, max(now - self.started_at, 1e-9))
+
+        worker_rates = dict()
+        for metrics in self.recent:
+            worker_rates[metrics.worker] = worker_rates.get(metrics.worker, 0) + 1 / window
+        ticks = sum(metrics.ticks for metrics in self.recent)
+        simulation_time = sum(metrics.phase_times.get(phase, 0) for metrics in self.recent for phase in simulation_phases)
+        db_writes = [metrics.phase_times['db_write'] for metrics in self.recent if 'db_write' in metrics.phase_times]
+
+        return {
+            'time': now,
+            'simulations': sum(self.simulation_counts.values()),
+            'worker_simulations': dict(self.simulation_counts),
+            'simulations_per_second': len(self.recent) / window,
+            'worker_simulations_per_second': worker_rates,
+            'phase_seconds': dict(self.phase_totals),
+            'ticks_per_second': ticks / simulation_time if simulation_time > 0 else 0,
+            'max_event_queue_depth': max((metrics.max_event_queue_depth for metrics in self.recent), default=0),
+            'db_write_seconds_average': sum(db_writes) / len(db_writes) if db_writes else 0,
+            'db_write_seconds_max': max(db_writes, default=0),
+            'worker_busy_seconds': dict(busy_times or {}),
+            'profile': profiler.summary(self.profile),
+        }
+
+    def export(self, busy_times: Dict[int, float] = None):
+        snapshot = self.snapshot(busy_times)
+        temporary_file = self.prometheus_file + '.tmp'
+        with open(temporary_file, 'w') as file:
+            file.write(prometheus_text(snapshot))
+        # readers never see a partially written file
+        os.replace(temporary_file, self.prometheus_file)
+        with open(self.log_file, 'a') as file:
+            file.write(json.dumps(snapshot) + '\n')
+
+def prometheus_text(snapshot: dict) -> str:
+    lines: List[str] = []
+
+    def metric(name: str, type: str, help: str, values):
+        lines.append(f'# HELP rev_{name} {help}')
+        lines.append(f'# TYPE rev_{name} {type}')
+        for labels, value in values:
+            label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+            lines.append(f'rev_{name}{{{label_text}}} {value}' if label_text else f'rev_{name} {value}')
+
+    metric('simulations_total', 'counter', 'Simulations written to the database',
+           [({}, snapshot['simulations'])] +
+           [({'worker': worker}, count) for worker, count in sorted(snapshot['worker_simulations'].items())])
+    metric('simulations_per_second', 'gauge', 'Simulations per second in the last window',
+           [({}, snapshot['simulations_per_second'])] +
+           [({'worker': worker}, rate) for worker, rate in sorted(snapshot['worker_simulations_per_second'].items())])
+    metric('phase_seconds_total', 'counter', 'Time spent in the simulation phases',
+           [({'phase': phase}, seconds) for phase, seconds in snapshot['phase_seconds'].items()])
+    metric('ticks_per_second', 'gauge', 'Simulated time steps per second in the last window',
+           [({}, snapshot['ticks_per_second'])])
+    metric('event_queue_depth_max', 'gauge', 'Maximum length of the event list in the last window',
+           [({}, snapshot['max_event_queue_depth'])])
+    metric('db_write_seconds', 'gauge', 'Database insert and commit time per simulation in the last window',
+           [({'statistic': 'average'}, snapshot['db_write_seconds_average']),
+            ({'statistic': 'max'}, snapshot['db_write_seconds_max'])])
+    metric('worker_busy_seconds', 'gauge', 'Time the worker spent on its running simulation',
+           [({'worker': worker}, seconds) for worker, seconds in sorted(snapshot['worker_busy_seconds'].items())])
+    if snapshot['profile']:
+        metric('profile_seconds', 'gauge', 'Duration percentiles of the profiled code, see profiler.py',
+               [({'name': name, 'quantile': quantile}, summary[statistic])
+                for name, summary in snapshot['profile'].items()
+                for quantile, statistic in [('0.5', 'p50'), ('0.9', 'p90'), ('0.99', 'p99'), ('1', 'max')]])
+    return '\n'.join(lines) + '\n'
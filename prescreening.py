@@ -0,0 +1,62 @@
+from typing import Set
+from base_model import ParameterCategories, SimulationParameters
+from simulation_env import SimulationEnvironment
+
+def has_constant_rule_functions(parameters: SimulationParameters) -> bool:
+    """
+    Returns True if every variable is set to the same value regardless of the state of its dependencies
+    """
+    for number_of_dependencies, rule_function in zip(parameters.number_of_dependencies_per_node,
+                                                     parameters.rule_functions_per_node):
+        mask = pow(2, pow(2, number_of_dependencies)) - 1
+        for element in rule_function.elements:
+            if element.int_representation & mask not in (0, mask):
+                return False
+    return True
+
+class PreScreening:
+    """
+    Predicts TIMEOUT and BAD parameter sets from cheap signals before they are fully simulated:
+    the structure of the rule functions, the size of the reachable set of the base model and
+    the speed of a truncated run of the distributed model.
+    A fraction of the predicted parameter sets is still simulated to audit the predictions.
+    """
+    audit_fraction: float
+    truncated_run_time: int
+    max_bad_state_count: int
+    error_model_cost_factor: float
+
+    def __init__(self, audit_fraction: float = 0.1, truncated_run_time: int = 2000, max_bad_state_count: int = 1,
+                 error_model_cost_factor: float = 3.0):
+        self.audit_fraction = audit_fraction
+        self.truncated_run_time = truncated_run_time
+        self.max_bad_state_count = max_bad_state_count
+        # the error models are slower than the distributed model since they additionally simulate the detection algorithms
+        self.error_model_cost_factor = error_model_cost_factor
+
+    def predict_from_base_model(self, parameters: SimulationParameters, base_model_states: Set[int]) -> ParameterCategories:
+        """
+        A base model reaching only a few states leaves no control faults that stay long enough in the fault space
+        """
+        if len(base_model_states) <= self.max_bad_state_count or has_constant_rule_functions(parameters):
+            return ParameterCategories.BAD
+        return ParameterCategories.UNKNOWN
+
+    def predict_from_truncated_run(self, env: SimulationEnvironment, run_time: float, stop_time: int) -> ParameterCategories:
+        """
+        Extrapolates the run time of the remaining simulations from the truncated run of the distributed model
+        """
+        if env.timed_out:
+            return ParameterCategories.TIMEOUT
+        if env.stopped() or env.time == 0:
+            return ParameterCategories.UNKNOWN
+        projected_run_time = run_time / env.time * stop_time * self.error_model_cost_factor
+        if projected_run_time > env.timeout_after:
+            return ParameterCategories.TIMEOUT
+        return ParameterCategories.UNKNOWN
+
+    def audit(self, generator) -> bool:
+        """
+        Returns True if a predicted parameter set should be simulated anyway
+        """
+        return generator.random() < self.audit_fraction
@@ -0,0 +1,145 @@
+from functools import wraps
+from typing import Dict
+
+import time
+
+# profiling is off unless enabled before the worker processes are started, they inherit the flag
+enabled = False
+
+class Histogram:
+    """
+    Durations in nanoseconds counted in power of two buckets, bucket i holds the durations d with
+    2**(i-1) <= d < 2**i. Percentiles are exact up to a factor of two, histograms of any number of processes can be
+    merged without keeping the durations
+    """
+    buckets: list
+    count: int
+    total: int
+    min: int
+    max: int
+
+    def __init__(self):
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def add(self, duration: int):
+        self.buckets[min(duration.bit_length(), 63)] += 1
+        self.min = duration if self.count == 0 else min(self.min, duration)
+        self.max = max(self.max, duration)
+        self.count += 1
+        self.total += duration
+
+    def merge(self, other: 'Histogram'):
+        if other.count == 0:
+            return
+        self.buckets = [count + other_count for count, other_count in zip(self.buckets, other.buckets)]
+        self.min = other.min if self.count == 0 else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def percentile(self, percent: float) -> int:
+        """
+        Returns an upper bound of the duration below which percent of the durations are
+        """
+        rank = percent / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(2 ** i - 1, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        """
+        Returns the statistics of the durations in seconds
+        """
+        return {'count': self.count, 'total': self.total / 1e9, 'mean': self.total / max(self.count, 1) / 1e9,
+                'min': self.min / 1e9, 'p50': self.percentile(50) / 1e9, 'p90': self.percentile(90) / 1e9,
+                'p99': self.percentile(99) / 1e9, 'max': self.max / 1e9}
+
+# histograms of this process since the last take
+histograms: Dict[str, Histogram] = dict()
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def record(name: str, duration: int):
+    histogram = histograms.get(name)
+    if histogram is None:
+        histogram = histograms[name] = Histogram()
+    histogram.add(duration)
+
+class Timer:
+    """
+    Context manager recording the duration of its block
+    """
+    __slots__ = ['name', 'start']
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exception):
+        record(self.name, time.perf_counter_ns() - self.start)
+
+class _DisabledTimer:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exception):
+        pass
+
+_disabled_timer = _DisabledTimer()
+
+def timer(name: str):
+    """
+    Returns a context manager recording the duration of its block if profiling is enabled
+    """
+    return Timer(name) if enabled else _disabled_timer
+
+def timed(name: str = None):
+    """
+    Decorator recording the duration of every call if profiling is enabled, by default under the qualified name
+    of the function
+    """
+    def decorator(function):
+        timer_name = name if name is not None else function.__qualname__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(timer_name, time.perf_counter_ns() - start)
+        return wrapper
+    return decorator
+
+def take() -> Dict[str, Histogram]:
+    """
+    Returns the histograms of this process and starts new ones, e.g. to send them to the orchestrator
+    """
+    global histograms
+    taken = histograms
+    histograms = dict()
+    return taken
+
+def merge(target: Dict[str, Histogram], source: Dict[str, Histogram]):
+    for name, histogram in source.items():
+        target.setdefault(name, Histogram()).merge(histogram)
+
+def summary(profile: Dict[str, Histogram]) -> Dict[str, dict]:
+    return {name: histogram.summary() for name, histogram in sorted(profile.items())}
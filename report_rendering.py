@@ -0,0 +1,57 @@
+from pandas.core.frame import DataFrame
+from matplotlib.figure import Figure
+
+import pandas as pd
+
+table_formats = ["png", "html", "csv"]
+
+# one figure per process is reused for all tables and curves. Figures created without pyplot are not kept alive
+# by pyplot, so nothing accumulates over the reports
+_figure: Figure = None
+
+def _clear_figure() -> Figure:
+    global _figure
+    if _figure is None:
+        _figure = Figure()
+    _figure.clf()
+    return _figure
+
+def _cell_texts(table: DataFrame, number_format: str):
+    columns = []
+    for column in table.columns:
+        if pd.api.types.is_numeric_dtype(table[column]):
+            columns.append([number_format.format(value) if pd.notna(value) else "-" for value in table[column]])
+        else:
+            columns.append([str(value) for value in table[column]])
+    return [list(row) for row in zip(*columns)]
+
+def render_table(table: DataFrame, file_name: str, number_format: str = "{:.0f}", table_format: str = "png"):
+    """
+    Writes the table to file_name with the extension of the format. PNG tables are drawn with matplotlib, HTML and
+    CSV are written by pandas. The numbers are formatted with number_format except in CSV files
+    """
+    if table_format == "csv":
+        table.to_csv(file_name + ".csv", index=False)
+        return
+    cells = _cell_texts(table, number_format)
+    if table_format == "html":
+        DataFrame(cells, columns=table.columns).to_html(file_name + ".html", index=False, justify="center")
+        return
+    figure = _clear_figure()
+    figure.set_size_inches(1.4 * len(table.columns), 0.3 * (len(table) + 1))
+    axes = figure.add_axes([0, 0, 1, 1])
+    axes.axis("off")
+    # matplotlib needs at least one row
+    drawn_table = axes.table(cellText=cells or [[""] * len(table.columns)],
+                             colLabels=[str(column) for column in table.columns], loc="center", cellLoc="center")
+    drawn_table.auto_set_font_size(False)
+    drawn_table.set_fontsize(9)
+    drawn_table.auto_set_column_width(list(range(len(table.columns))))
+    drawn_table.scale(1, 1.2)
+    figure.savefig(file_name + ".png", bbox_inches="tight", dpi=150)
+
+def render_curve(table: DataFrame, file_name: str, title: str, xlabel: str, ylabel: str):
+    figure = _clear_figure()
+    figure.set_size_inches(6.4, 4.8)
+    table.plot(ax=figure.add_subplot(), title=title, xlabel=xlabel, ylabel=ylabel)
+    figure.savefig(file_name + ".png")
@@ -0,0 +1,89 @@
+from typing import List, Set
+from base_model import SimulationParameters
+from fault_classification import ControlFaultClassification
+
+import hashlib
+import json
+import os
+
+def hash_parameters(parameters: SimulationParameters) -> str:
+    """
+    Returns a canonical hash of everything that determines the outcome of a simulation run
+    """
+    canonical = {
+        'number_of_nodes': parameters.number_of_nodes,
+        'number_of_variables_per_node': list(parameters.number_of_variables_per_node),
+        'number_of_dependencies_per_node': list(parameters.number_of_dependencies_per_node),
+        'rule_functions_per_node': [
+            [rule_function.dependencies.int_representation, [e.int_representation for e in rule_function.elements]]
+            for rule_function in parameters.rule_functions_per_node],
+        'initial_state': parameters.initial_state,
+        'min_delay': parameters.min_delay,
+        'max_delay': parameters.max_delay,
+        'delay_type': parameters.delay_type.name,
+        'seed': parameters.seed,
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+class CachedResult:
+    timed_out: bool
+    base_model_states: Set[int]
+    distributed_model_states: Set[int]
+    control_fault_space: Set[int]
+    control_fault_classifications: List[ControlFaultClassification]
+
+    def __init__(self):
+        self.timed_out = False
+        self.base_model_states = set()
+        self.distributed_model_states = set()
+        self.control_fault_space = set()
+        self.control_fault_classifications = []
+
+class ResultCache:
+    """
+    On-disk cache of reached states and classification results keyed by the parameter hash.
+    Every entry is a single file which is replaced atomically, so the cache can be shared by all workers.
+    """
+    directory: str
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _file_name(self, parameters_hash: str) -> str:
+        return os.path.join(self.directory, parameters_hash[:2], parameters_hash + '.json')
+
+    def load(self, parameters_hash: str) -> CachedResult:
+        try:
+            with open(self._file_name(parameters_hash)) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        result = CachedResult()
+        result.timed_out = data['timed_out']
+        result.base_model_states = set(data['base_model_states'])
+        result.distributed_model_states = set(data['distributed_model_states'])
+        result.control_fault_space = set(data['control_fault_space'])
+        for state, dwell_time, detectable in data['control_fault_classifications']:
+            classification = ControlFaultClassification()
+            classification.state = state
+            classification.dwell_time = dwell_time
+            classification.detectable = detectable
+            result.control_fault_classifications.append(classification)
+        return result
+
+    def store(self, parameters_hash: str, result: CachedResult):
+        data = {
+            'timed_out': result.timed_out,
+            'base_model_states': sorted(result.base_model_states),
+            'distributed_model_states': sorted(result.distributed_model_states),
+            'control_fault_space': sorted(result.control_fault_space),
+            'control_fault_classifications': [[c.state, c.dwell_time, c.detectable]
+                                              for c in result.control_fault_classifications],
+        }
+        file_name = self._file_name(parameters_hash)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        temp_file_name = f"{file_name}.{os.getpid()}.tmp"
+        with open(temp_file_name, 'w') as file:
+            json.dump(data, file)
+        os.replace(temp_file_name, file_name)
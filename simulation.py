@@ -1,14 +1,24 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import itertools
+from queue import Empty
 import random
 from signal import SIGINT, signal
-from database import commit, insert_table, write_statistics
+import time
+import base_model_ensemble
+import profiler
+from adaptive_sampler import AdaptiveSampler, format_cell
 from delay_functions import DelayTypes
-from error_model import ErrorSimulationModel, Statistics
+from error_model import ErrorSimulationModel, Statistics, StatisticsSummary
+from fault_classification import ControlFaultClassification, classify_control_faults
+from metrics import SimulationMetrics
+from prescreening import PreScreening
+from result_cache import CachedResult, ResultCache, hash_parameters
 from simulation_objects import RuleFunction
+from simulation_profiling import SimulationProfiling
+from storage import StorageBackend
 from base_model import BaseModelSimulationEnvironment, ParameterCategories
 from distributed_model import DistributedModelSimulationEnvironment, SimulationParameters
-from typing import Dict, Set
+from typing import Dict, List, Set, Tuple
 
 from base_model import SimulationParameters
 
@@ -16,22 +26,35 @@ max_number_of_nodes = 10
 max_number_of_variables_per_node = 5
 max_number_of_dependencies_per_node = 5 
 stop_time = 50000
+result_cache_directory = "simulations/cache"
 
 @dataclass
 class SimulationStatistics:
     full_state_statistics: Statistics
     timestamp_statistics: Statistics
     token_statistics: Statistics
+    summaries: List[StatisticsSummary] = field(default_factory=list)
 
 # TODO: generate parameters for distributed experiments
 def get_random_parameters(max_number_of_nodes: int, max_number_of_variables_per_node: int,
-                          max_number_of_dependencies_per_node: int) -> SimulationParameters:
+                          max_number_of_dependencies_per_node: int, number_of_nodes: int = None,
+                          number_of_variables: int = None, delay_type: DelayTypes = None) -> SimulationParameters:
     """
-    Randomly generates a simulation parameters object
+    Randomly generates a simulation parameters object.
+    number_of_nodes, number_of_variables and delay_type can be fixed to generate parameters for a specific cell
     """
-    number_of_nodes = random.randint(2, max_number_of_nodes)
-    number_of_variables_per_node = [random.randint(1, max_number_of_variables_per_node) for i in range(number_of_nodes)]
-    number_of_variables = sum(number_of_variables_per_node)
+    if number_of_nodes is None:
+        number_of_nodes = random.randint(2, max_number_of_nodes)
+    if number_of_variables is None:
+        number_of_variables_per_node = [random.randint(1, max_number_of_variables_per_node) for i in range(number_of_nodes)]
+        number_of_variables = sum(number_of_variables_per_node)
+    else:
+        # distribute the variables randomly while every node controls at least one variable
+        number_of_variables_per_node = [1 for i in range(number_of_nodes)]
+        for i in range(number_of_variables - number_of_nodes):
+            node = random.choice([j for j in range(number_of_nodes)
+                                  if number_of_variables_per_node[j] < max_number_of_variables_per_node])
+            number_of_variables_per_node[node] += 1
     number_of_dependencies_per_node = [random.randint(1, min(max_number_of_dependencies_per_node, number_of_variables))
                                        for i in range(number_of_nodes)]
     dependencies_per_node = [
@@ -47,131 +70,328 @@ def get_random_parameters(max_number_of_nodes: int, max_number_of_variables_per_
             dependencies_per_node[i]) for i in range(number_of_nodes)]
     initial_state = 0
 
-    delay_type = DelayTypes.random(random)
+    if delay_type is None:
+        delay_type = DelayTypes.random(random)
 
     return SimulationParameters(number_of_nodes, number_of_variables_per_node, number_of_dependencies_per_node, rule_function_per_node, initial_state, 
                                 20, 100, delay_type, random.randint(0, 1000000), ParameterCategories.UNKNOWN)
 
-def check_for_timeout(env, parameters, lock) -> bool:
-    if env.timed_out:
+@dataclass
+class SimulationResult:
+    parameters: SimulationParameters
+    control_statistics: SimulationStatistics = None
+    infrastructure_statistics: SimulationStatistics = None
+    control_fault_classifications: List[ControlFaultClassification] = field(default_factory=list)
+    seed: int = None # campaign seed the parameters were generated from
+    metrics: SimulationMetrics = None
+    cell: str = None # cell drawn by the adaptive sampler for the seed, see AdaptiveSampler
+
+def check_for_timeout(env, parameters) -> bool:
+    if env is None or env.timed_out:
         parameters.category = ParameterCategories.TIMEOUT
-        lock.acquire()
-        insert_table('simulation', cls=parameters)
-        commit()
-        lock.release()
         return True
     else:
         return False
 
+def skip_predicted_parameters(parameters, prescreening, predicted_category) -> bool:
+    """
+    Records the prediction of the pre-screening and returns True if the parameter set is skipped
+    """
+    parameters.predicted_category = predicted_category
+    if predicted_category == ParameterCategories.UNKNOWN or prescreening.audit(random.Random(parameters.seed)):
+        return False
+    parameters.category = ParameterCategories.SKIPPED
+    return True
+
 def sigint_handler(signum, frame):
     pass
 
-def start_simulating(database_lock, seed, good_simulations, bad_simulations, faulty_simulations, timed_out_simulations):
-
-    signal(SIGINT, sigint_handler)
-
-    # make simulation deterministic by starting with the given seed
-    random.seed(seed)
-
-    while True:
+def simulate_parameters(parameters: SimulationParameters, result_cache: ResultCache,
+                        prescreening: PreScreening = None, metrics: SimulationMetrics = None,
+                        base_model_states: Set[int] = None, base_model_time: float = 0) -> SimulationResult:
+    """
+    Simulates a parameter set and returns the results. The category of the parameter set is stored in the parameters,
+    the phase times are added to metrics. base_model_states are the states of the base model if it was already
+    simulated, e.g. by a BaseModelEnsemble in base_model_time seconds
+    """
+    if metrics is None:
+        metrics = SimulationMetrics()
 
-        parameters = get_random_parameters(max_number_of_nodes, max_number_of_variables_per_node,
-                                        max_number_of_dependencies_per_node)
+    # set new random seed to make the simulation run depend only on the generated parameters
+    random.seed(parameters.seed)
 
-        # set new random seed to make the simulation run depend only on the generated parameters
-        random.seed(parameters.seed)
+    parameters.parameters_hash = hash_parameters(parameters)
+    cached_result = result_cache.load(parameters.parameters_hash)
+    parameters.cache_hit = cached_result is not None
+    if cached_result is None:
+        cached_result = CachedResult()
+    elif cached_result.timed_out:
+        check_for_timeout(None, parameters)
+        return SimulationResult(parameters)
 
-        # we use the local states of the nodes since the global state cannot 
-        # be accessed by a node during execution for fault classification
-        env = BaseModelSimulationEnvironment(parameters)
-        env.run(stop_time)
-        if check_for_timeout(env, parameters, database_lock):
-            timed_out_simulations.value += 1
-            continue
+    if parameters.cache_hit:
+        base_model_states = cached_result.base_model_states
+        distributed_model_states = cached_result.distributed_model_states
+    else:
+        if base_model_states is not None:
+            metrics.phase_times['base'] = base_model_time
+            reached_states = base_model_states
+        else:
+            # we use the local states of the nodes since the global state cannot 
+            # be accessed by a node during execution for fault classification
+            with metrics.phase('base'):
+                env = BaseModelSimulationEnvironment(parameters)
+                env.run(stop_time)
+            metrics.record_run(env)
+            if check_for_timeout(env, parameters):
+                cached_result.timed_out = True
+                result_cache.store(parameters.parameters_hash, cached_result)
+                return SimulationResult(parameters)
+            reached_states = env.nodes[0].reached_states
         base_model_states=set()
-        for reached_state in env.nodes[0].reached_states:
+        for reached_state in reached_states:
             base_model_states.add(reached_state)
 
+        if prescreening is not None:
+            predicted_category = prescreening.predict_from_base_model(parameters, base_model_states)
+            if skip_predicted_parameters(parameters, prescreening, predicted_category):
+                return SimulationResult(parameters)
+
         env = DistributedModelSimulationEnvironment(parameters)
-        env.run(stop_time)
-        if check_for_timeout(env, parameters, database_lock):
-            timed_out_simulations.value += 1
-            continue
+        if prescreening is not None and parameters.predicted_category == ParameterCategories.UNKNOWN:
+            # the truncated run is continued below if the parameter set is not skipped
+            truncated_run_start = time.time()
+            with metrics.phase('distributed'):
+                env.run(prescreening.truncated_run_time)
+            predicted_category = prescreening.predict_from_truncated_run(env, time.time() - truncated_run_start,
+                                                                         stop_time)
+            if skip_predicted_parameters(parameters, prescreening, predicted_category):
+                metrics.record_run(env)
+                return SimulationResult(parameters)
+        with metrics.phase('distributed'):
+            env.run(stop_time)
+        metrics.record_run(env)
+        if check_for_timeout(env, parameters):
+            cached_result.timed_out = True
+            result_cache.store(parameters.parameters_hash, cached_result)
+            return SimulationResult(parameters)
         distributed_model_states=set()
         for reached_state in env.nodes[0].reached_states:
             distributed_model_states.add(reached_state)
 
-        # BEGIN OF SIMULATION CHECKING ####################################################################
-        shared_states = base_model_states.intersection(distributed_model_states)
-            
-        control_fault_space = set(random.choices(list(shared_states), k=max(1,len(shared_states)//2)))
+    # BEGIN OF SIMULATION CHECKING ####################################################################
+    shared_states = base_model_states.intersection(distributed_model_states)
+        
+    # the fault space is always drawn to keep the random sequence independent of the cache content
+    control_fault_space = set(random.choices(list(shared_states), k=max(1,len(shared_states)//2)))
 
+    if parameters.cache_hit:
+        control_fault_space = cached_result.control_fault_space
+        control_fault_classifications = cached_result.control_fault_classifications
+    else:
         # a control fault is not detectable by token / hard to detect by timestamp if it is resolved in under min_delay*2 timesteps
-        not_detectable: Dict[int, bool] = dict() 
-        for control_fault in control_fault_space:
-            error_node = env.nodes[0]
-            not_detectable[control_fault] = True
-            if control_fault in error_node.reached_states:
-                for i in range(len(error_node.state_history)):
-                    if error_node.state_history[i][0] == control_fault:
-                        j = i
-                        while error_node.state_history[j][0] in control_fault_space and j+1 < len(error_node.state_history):
-                            j += 1
-                        if error_node.state_history[j][1] - error_node.state_history[i][1] > 2 * parameters.min_delay:
-                            not_detectable[control_fault] = False
-                            break
-
-        invalid: Set[int] = set()
-        for control_fault in control_fault_space:
-            if not_detectable[control_fault]:
-                invalid.add(control_fault)
-        
-        if len(control_fault_space) == len(invalid):
-            parameters.category = ParameterCategories.BAD
-        # END OF SIMULATION CHECKING ######################################################################
+        with metrics.phase('classification'):
+            control_fault_classifications = classify_control_faults(env.nodes[0].state_history, control_fault_space,
+                                                                    parameters.min_delay)
+
+        cached_result.base_model_states = base_model_states
+        cached_result.distributed_model_states = distributed_model_states
+        cached_result.control_fault_space = control_fault_space
+        cached_result.control_fault_classifications = control_fault_classifications
+        result_cache.store(parameters.parameters_hash, cached_result)
+
+    invalid: Set[int] = set()
+    for classification in control_fault_classifications:
+        if not classification.detectable:
+            invalid.add(classification.state)
+    
+    if len(control_fault_space) == len(invalid):
+        parameters.category = ParameterCategories.BAD
+    # END OF SIMULATION CHECKING ######################################################################
 
-        if parameters.category == ParameterCategories.UNKNOWN:
-            parameters.category = ParameterCategories.GOOD
+    if parameters.category == ParameterCategories.UNKNOWN:
+        parameters.category = ParameterCategories.GOOD
 
-        infrastructure_states = list(distributed_model_states.difference(base_model_states))
-        infrastructure_fault_space = set(random.choices(infrastructure_states, k=len(infrastructure_states)//2))
+    infrastructure_states = list(distributed_model_states.difference(base_model_states))
+    infrastructure_fault_space = set(random.choices(infrastructure_states, k=len(infrastructure_states)//2))
 
+    with metrics.phase('control'):
         c_env = ErrorSimulationModel(parameters, fault_space=control_fault_space)
         c_env.run(stop_time)
-        if check_for_timeout(c_env, parameters, database_lock):
-            timed_out_simulations.value += 1
-            continue
-        control_fault_model_states=set()
-        for reached_state in c_env.nodes[0].reached_states:
-            control_fault_model_states.add(reached_state)
-        if not control_fault_model_states == distributed_model_states:
-            print(control_fault_model_states.difference(distributed_model_states))
-            print(distributed_model_states.difference(control_fault_model_states))
-            parameters.category = ParameterCategories.FAULTY
+    metrics.record_run(c_env)
+    if check_for_timeout(c_env, parameters):
+        cached_result.timed_out = True
+        result_cache.store(parameters.parameters_hash, cached_result)
+        return SimulationResult(parameters)
+    control_fault_model_states=set()
+    for reached_state in c_env.nodes[0].reached_states:
+        control_fault_model_states.add(reached_state)
+    if not control_fault_model_states == distributed_model_states:
+        print(control_fault_model_states.difference(distributed_model_states))
+        print(distributed_model_states.difference(control_fault_model_states))
+        parameters.category = ParameterCategories.FAULTY
 
+    with metrics.phase('infrastructure'):
         i_env = ErrorSimulationModel(parameters, fault_space=infrastructure_fault_space)
         i_env.run(stop_time)
-        if check_for_timeout(i_env, parameters, database_lock):
-            timed_out_simulations.value += 1
+    metrics.record_run(i_env)
+    if check_for_timeout(i_env, parameters):
+        cached_result.timed_out = True
+        result_cache.store(parameters.parameters_hash, cached_result)
+        return SimulationResult(parameters)
+    infrastructure_fault_model_states=set()
+    for reached_state in i_env.nodes[0].reached_states:
+        infrastructure_fault_model_states.add(reached_state)
+    if not infrastructure_fault_model_states == distributed_model_states:
+        print(infrastructure_fault_model_states.difference(distributed_model_states))
+        print(distributed_model_states.difference(infrastructure_fault_model_states))
+        parameters.category = ParameterCategories.FAULTY
+
+    return SimulationResult(parameters, SimulationStatistics(c_env.full_state_statistics, c_env.timestamp_statistics,
+                                                             c_env.token_statistics, c_env.summaries()),
+                            SimulationStatistics(i_env.full_state_statistics, i_env.timestamp_statistics,
+                                                 i_env.token_statistics, i_env.summaries()),
+                            control_fault_classifications)
+
+def simulate_seed(seed: int, result_cache: ResultCache, sampler: AdaptiveSampler = None,
+                  prescreening: PreScreening = None, base_model_states: Set[int] = None,
+                  base_model_time: float = 0) -> SimulationResult:
+    """
+    Generates and simulates the parameter set of a seed. Returns None if the sampler reached all of its targets.
+    base_model_states are passed to simulate_parameters, see ensemble_base_model_states
+    """
+    # make simulation deterministic by starting with the given seed
+    random.seed(seed)
+
+    if sampler is None:
+        parameters = get_random_parameters(max_number_of_nodes, max_number_of_variables_per_node,
+                                        max_number_of_dependencies_per_node)
+    else:
+        cell = sampler.next_cell(random)
+        if cell is None:
+            # every cell of the evaluation reached its stopping target
+            return None
+        parameters = get_random_parameters(max_number_of_nodes, max_number_of_variables_per_node,
+                                           max_number_of_dependencies_per_node, **cell)
+
+    metrics = SimulationMetrics(seed=seed)
+    result = simulate_parameters(parameters, result_cache, prescreening, metrics, base_model_states, base_model_time)
+    result.seed = seed
+    result.metrics = metrics
+    if sampler is not None:
+        result.cell = format_cell(cell)
+    if profiler.enabled:
+        metrics.profile = profiler.take()
+    return result
+
+def ensemble_base_model_states(seeds: List[int], sampler: AdaptiveSampler = None) -> Tuple[Dict[int, Set[int]], float]:
+    """
+    Simulates the base model of the parameter sets of a seed batch at once with a BaseModelEnsemble. Returns the
+    base model states per seed and the simulation time per seed. The parameter sets drawn by a sampler depend on the
+    results of the seeds before, so batches are only simulated in advance without sampler
+    """
+    if sampler is not None or len(seeds) < 2:
+        return dict(), 0
+    start = time.perf_counter()
+    batch_seeds, parameter_sets = [], []
+    for seed in seeds:
+        # the same parameter set as in simulate_seed
+        random.seed(seed)
+        parameters = get_random_parameters(max_number_of_nodes, max_number_of_variables_per_node,
+                                           max_number_of_dependencies_per_node)
+        if base_model_ensemble.supports(parameters):
+            batch_seeds.append(seed)
+            parameter_sets.append(parameters)
+    if not parameter_sets:
+        return dict(), 0
+    states = base_model_ensemble.ensemble_base_model_states(parameter_sets, stop_time)
+    return dict(zip(batch_seeds, states)), (time.perf_counter() - start) / len(parameter_sets)
+
+def start_writing(writes, stopped, storage: StorageBackend, metrics_queue=None, max_transaction_time: float = 1,
+                  max_transaction_size: int = 100):
+    """
+    Writes the journal entries and results of the writes queue to the storage until the stopped event is set and
+    the queue is empty. This is the only process writing to the storage, the messages arriving within
+    max_transaction_time are written in one transaction. The metrics of every written result are sent to the
+    metrics_queue, its db_write time includes an equal share of the commit of the transaction
+    """
+
+    # the writer exits after the queued results are written
+    signal(SIGINT, sigint_handler)
+
+    while True:
+        try:
+            message = writes.get(timeout=1)
+        except Empty:
+            if stopped.is_set():
+                return
             continue
-        infrastructure_fault_model_states=set()
-        for reached_state in i_env.nodes[0].reached_states:
-            infrastructure_fault_model_states.add(reached_state)
-        if not infrastructure_fault_model_states == distributed_model_states:
-            print(infrastructure_fault_model_states.difference(distributed_model_states))
-            print(distributed_model_states.difference(infrastructure_fault_model_states))
-            parameters.category = ParameterCategories.FAULTY
-
-        if parameters.category == ParameterCategories.GOOD:
-            good_simulations.value += 1
-        elif parameters.category == ParameterCategories.BAD:
-            bad_simulations.value += 1
-        elif parameters.category == ParameterCategories.FAULTY:
-            faulty_simulations.value += 1
-        
-        database_lock.acquire()
-        simulation_reference=insert_table('simulation', cls=parameters) 
-        write_statistics('control_', c_env, simulation_reference)
-        write_statistics('infrastructure_', i_env, simulation_reference)
-        commit()
-        database_lock.release()
\ No newline at end of file
+        transaction_start = time.time()
+        transaction_size = 0
+        written_metrics = []
+        while True:
+            if message[0] == 'started':
+                storage.write_started(message[1])
+            else:
+                result = message[1]
+                write_start = time.perf_counter()
+                storage.write_result(result)
+                if result.metrics is not None:
+                    result.metrics.phase_times['db_write'] = time.perf_counter() - write_start
+                    written_metrics.append(result.metrics)
+            transaction_size += 1
+            remaining_time = transaction_start + max_transaction_time - time.time()
+            if transaction_size >= max_transaction_size or remaining_time <= 0:
+                break
+            try:
+                message = writes.get(timeout=remaining_time)
+            except Empty:
+                break
+        commit_start = time.perf_counter()
+        storage.commit()
+        commit_time = time.perf_counter() - commit_start
+        for metrics in written_metrics:
+            metrics.phase_times['db_write'] += commit_time / len(written_metrics)
+        if metrics_queue is not None:
+            for metrics in written_metrics:
+                metrics.finished_at = time.time()
+                metrics_queue.put(metrics)
+
+def start_simulating(storage: StorageBackend, tasks, simulation_counts, busy_since, sampler: AdaptiveSampler = None,
+                     prescreening: PreScreening = None, worker_id: int = 0, profiling: SimulationProfiling = None):
+    """
+    Simulates the seed batches of the task queue until it receives None. The journal entries and results are
+    written to the storage, in the simulation pool a QueueStorage sending them to the writer process.
+    simulation_counts and busy_since are shared memory written only by this worker: the number of simulations
+    per category and the start time of the running simulation (0 while idle, -1 once the sampler is finished).
+    With profiling the sampled simulations are profiled
+    """
+
+    signal(SIGINT, sigint_handler)
+
+    result_cache = ResultCache(result_cache_directory)
+
+    while True:
+        seeds = tasks.get()
+        if seeds is None:
+            return
+
+        busy_since.value = time.time()
+        base_model_states, base_model_time = ensemble_base_model_states(seeds, sampler)
+        for seed in seeds:
+            busy_since.value = time.time()
+            storage.write_started(seed)
+            session = profiling.start(seed) if profiling is not None else None
+            result = simulate_seed(seed, result_cache, sampler, prescreening, base_model_states.get(seed),
+                                   base_model_time)
+            if profiling is not None:
+                profiling.finish(session, seed, result)
+            if result is None:
+                busy_since.value = -1
+                return
+            result.metrics.worker = worker_id
+            storage.write_result(result)
+            storage.commit()
+            simulation_counts[result.parameters.category.value] += 1
+
+        busy_since.value = 0
@@ -1,17 +1,27 @@
 from typing import Any, List, Tuple
 import time
 
+import profiler
+
 class SimulationEnvironment:
     time: int
     events_occured: bool
     event_list: List[Tuple[int, Any]] 
     timed_out: bool
+    max_event_list_length: int
+    event_count: int # number of created events
+    run_time: float # wall time spent in run, over all calls
+    timeout_after: int = 60 * 10 # set timeout to 10 minutes
 
     def __init__(self):
         self.time = 0
         self.events_occured = True
         self.event_list = []
         self.timed_out = False
+        self.max_event_list_length = 0
+        self.event_count = 0
+        self.run_time = 0
+        self._stop = False
     
     def create_event(self, time, event):
         lo = 0
@@ -23,6 +33,9 @@ class SimulationEnvironment:
             else:
                 lo = mid+1
         self.event_list.insert(lo, (time, event))
+        self.event_count += 1
+        if len(self.event_list) > self.max_event_list_length:
+            self.max_event_list_length = len(self.event_list)
 
     def step(self):
         self.time += 1
@@ -35,18 +48,29 @@ class SimulationEnvironment:
         self.events_occured=False
 
     def run(self, stop_time: int):
-        self._stop=False
-        timeout_after = 60 * 10 # set timeout to 10 minutes
-        start_time = time.time()
+        """
+        Runs the simulation until stop_time or until it is stopped. A simulation that was run until an earlier
+        stop_time can be continued by calling run again, the timeout applies to the time of all runs.
+        """
+        start_time = time.time() - self.run_time
+        if profiler.enabled and 'handle_event' not in self.__dict__:
+            # the handlers of this environment are replaced by timed handlers, step stays the same
+            name = type(self).__name__
+            self.handle_event = profiler.timed(name + '.handle_event')(self.handle_event)
+            self.handle_time_step = profiler.timed(name + '.handle_time_step')(self.handle_time_step)
         while self.time < stop_time and not self._stop:
-            if time.time() - start_time > timeout_after:
+            if time.time() - start_time > self.timeout_after:
                 self.timed_out = True
-                return
+                break
             self.step()
+        self.run_time = time.time() - start_time
 
     def stop(self):
         self._stop=True
 
+    def stopped(self) -> bool:
+        return self._stop
+
     def handle_event(self, time: int, event: Any):
         """
         Will be called for every event.
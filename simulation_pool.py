@@ -0,0 +1,174 @@
+from multiprocessing import Array, Event, Process, Queue, Value, cpu_count
+from queue import Empty
+from typing import Dict, Iterator, List
+from base_model import ParameterCategories
+from simulation import start_simulating, start_writing
+from simulation_env import SimulationEnvironment
+from storage import QueueStorage, StorageBackend
+
+import time
+
+class SimulationWorker:
+    id: int
+    process: Process
+    simulation_counts: Array
+    busy_since: Value
+
+class SimulationPool:
+    """
+    Process pool of simulation workers pulling seed batches from a task queue.
+    Every worker counts its simulations in its own shared memory, so the counters need neither a manager nor a lock.
+    Workers that are stalled on a long running parameter set are temporarily replaced by additional workers.
+    The workers send their results to a single writer process writing them to the storage, so they never wait
+    for the database.
+    The writer reports the metrics of every written simulation to the metrics queue.
+    """
+    seeds: Iterator[int]
+    batch_size: int
+    stall_time: float
+    max_worker_count: int
+    worker_count: int
+    workers: List[SimulationWorker]
+    retirements: int # number of None tasks sent to retire workers
+
+    def __init__(self, seeds: Iterator[int], storage: StorageBackend, batch_size: int = 1, sampler=None, prescreening=None,
+                 stall_time: float = SimulationEnvironment.timeout_after / 2, max_worker_count: int = cpu_count(),
+                 writer_timeout: float = 60, profiling=None):
+        self.seeds = seeds
+        self.batch_size = batch_size
+        self.sampler = sampler
+        self.prescreening = prescreening
+        self.profiling = profiling
+        self.stall_time = stall_time
+        self.max_worker_count = max_worker_count
+        self.writer_timeout = writer_timeout
+        self.tasks = Queue()
+        self.metrics = Queue()
+        self.writes = Queue()
+        self.writes_stopped = Event()
+        self.writer = Process(target=start_writing, args=(self.writes, self.writes_stopped, storage, self.metrics))
+        self.writer.start()
+        self.seeds_exhausted = False
+        self.worker_count = 0
+        self.workers = []
+        self.retirements = 0
+
+    def _start_worker(self):
+        worker = SimulationWorker()
+        worker.id = len(self.workers)
+        worker.simulation_counts = Array('Q', len(ParameterCategories), lock=False)
+        worker.busy_since = Value('d', 0, lock=False)
+        args = (QueueStorage(self.writes), self.tasks, worker.simulation_counts, worker.busy_since, self.sampler,
+                self.prescreening, worker.id, self.profiling)
+        worker.process = Process(target=start_simulating, args=args)
+        worker.process.start()
+        self.workers.append(worker)
+
+    def _retire_worker(self):
+        # the first worker receiving None exits, every worker is equally suited
+        self.tasks.put(None)
+        self.retirements += 1
+
+    def _sampler_finished(self, worker: SimulationWorker) -> bool:
+        return worker.process.exitcode == 0 and worker.busy_since.value < 0
+
+    def active_worker_count(self) -> int:
+        """
+        Returns the number of running workers which are not retiring
+        """
+        retired = sum(1 for worker in self.workers if worker.process.exitcode == 0 and not self._sampler_finished(worker))
+        alive = sum(1 for worker in self.workers if worker.process.is_alive())
+        return alive - (self.retirements - retired)
+
+    def stalled_workers(self) -> List[SimulationWorker]:
+        now = time.time()
+        return [worker for worker in self.workers if worker.process.is_alive() and
+                worker.busy_since.value > 0 and now - worker.busy_since.value > self.stall_time]
+
+    def resize(self, worker_count: int):
+        """
+        Sets the number of workers that are not stalled
+        """
+        self.worker_count = max(0, min(self.max_worker_count, worker_count))
+        self.rebalance()
+
+    def rebalance(self):
+        """
+        Starts or retires workers, so that worker_count workers are not stalled
+        """
+        if any(self._sampler_finished(worker) for worker in self.workers):
+            self.seeds_exhausted = True
+        if self.seeds_exhausted:
+            return
+        desired = min(self.max_worker_count, self.worker_count + len(self.stalled_workers()))
+        while self.active_worker_count() < desired:
+            self._start_worker()
+        for i in range(self.active_worker_count() - desired):
+            self._retire_worker()
+
+    def feed(self):
+        """
+        Keeps about one seed batch per worker in the task queue, so batches are not hoarded by stalled workers
+        """
+        while not self.seeds_exhausted and self.tasks.qsize() < self.active_worker_count():
+            batch = []
+            for seed in self.seeds:
+                batch.append(seed)
+                if len(batch) == self.batch_size:
+                    break
+            else:
+                self.seeds_exhausted = True
+            if batch:
+                self.tasks.put(batch)
+            if self.seeds_exhausted:
+                # the workers exit after the remaining batches are simulated
+                for i in range(self.active_worker_count()):
+                    self._retire_worker()
+
+    def drain(self):
+        """
+        Drops the queued batches and lets the workers exit after their running batch
+        """
+        self.seeds_exhausted = True
+        try:
+            while True:
+                if self.tasks.get_nowait() is None:
+                    self.retirements -= 1
+        except Empty:
+            pass
+        for i in range(self.active_worker_count()):
+            self._retire_worker()
+
+    def alive(self) -> bool:
+        return any(worker.process.is_alive() for worker in self.workers)
+
+    def counts(self) -> List[int]:
+        """
+        Returns the number of simulations per category of all workers including the exited ones
+        """
+        return [sum(worker.simulation_counts[category.value] for worker in self.workers)
+                for category in ParameterCategories]
+
+    def busy_times(self) -> Dict[int, float]:
+        """
+        Returns the seconds every running worker has been working on its current simulation
+        """
+        now = time.time()
+        return {worker.id: now - worker.busy_since.value if worker.busy_since.value > 0 else 0
+                for worker in self.workers if worker.process.is_alive()}
+
+    def stop(self):
+        """
+        Terminates the workers and waits until the writer has written the results of the finished simulations
+        """
+        for worker in self.workers:
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.process.join()
+        self.writes_stopped.set()
+        self.writer.join(self.writer_timeout)
+        if self.writer.is_alive():
+            # a worker terminated while sending a result can leave a partial message in the queue,
+            # seeds without a committed result are not completed in the journal and simulated again on resume
+            self.writer.terminate()
+            self.writer.join()
@@ -0,0 +1,112 @@
+from collections import Counter
+from signal import ITIMER_PROF, SIGPROF, setitimer, signal
+from typing import Dict
+
+import cProfile
+import json
+import os
+import time
+
+class StackSampler:
+    """
+    Samples the call stack of the main thread every interval seconds of CPU time. The samples are counted as folded
+    stacks, the input format of flame graph tools like flamegraph.pl or speedscope. Sampling costs almost nothing,
+    so every simulation can be sampled and the samples of the fast ones dropped
+    """
+    interval: float
+    stacks: Counter
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.previous_handler = None
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.previous_handler = signal(SIGPROF, self._sample)
+        setitimer(ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        setitimer(ITIMER_PROF, 0, 0)
+        signal(SIGPROF, self.previous_handler)
+
+    def dump(self, file_name: str):
+        with open(file_name, 'w') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+def _parameters_tags(parameters) -> Dict:
+    # the rule functions are identified by the parameters hash
+    return {'number_of_nodes': parameters.number_of_nodes,
+            'number_of_variables_per_node': list(parameters.number_of_variables_per_node),
+            'number_of_dependencies_per_node': list(parameters.number_of_dependencies_per_node),
+            'min_delay': parameters.min_delay, 'max_delay': parameters.max_delay,
+            'delay_type': parameters.delay_type.name, 'seed': parameters.seed, 'category': parameters.category.name,
+            'parameters_hash': parameters.parameters_hash}
+
+class SimulationProfiling:
+    """
+    Profiles sampled simulations of a worker: every simulation whose seed is a multiple of every runs under cProfile,
+    the others are stack sampled if slower_than is set and their samples are kept if they took longer than
+    slower_than seconds. The dumps are written to directory, next to the results database, and tagged with the seed,
+    which the campaign journal maps to the simulation id, and the parameters
+    """
+    directory: str
+    every: int
+    slower_than: float
+
+    def __init__(self, directory: str, every: int = None, slower_than: float = None):
+        self.directory = directory
+        self.every = every
+        self.slower_than = slower_than
+
+    def start(self, seed: int):
+        """
+        Starts profiling the simulation of the seed, returns the running profiler or None
+        """
+        if self.every is not None and seed % self.every == 0:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        elif self.slower_than is not None:
+            profiler = StackSampler()
+            profiler.start()
+        else:
+            return None
+        return profiler, time.time()
+
+    def finish(self, session, seed: int, result):
+        """
+        Stops the profiler of start and writes the dump if the simulation was sampled
+        """
+        if session is None:
+            return
+        profiler, start_time = session
+        duration = time.time() - start_time
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            reason = 'every'
+        else:
+            profiler.stop()
+            if duration <= self.slower_than:
+                return
+            reason = 'slower_than'
+        os.makedirs(self.directory, exist_ok=True)
+        base_name = os.path.join(self.directory, f"seed_{seed}")
+        if isinstance(profiler, cProfile.Profile):
+            profiler.dump_stats(base_name + ".prof")
+        else:
+            profiler.dump(base_name + ".folded")
+        tags = {'seed': seed, 'reason': reason, 'duration': duration, 'pid': os.getpid()}
+        if result is not None:
+            tags['parameters'] = _parameters_tags(result.parameters)
+            if result.metrics is not None:
+                tags['phase_times'] = result.metrics.phase_times
+        with open(base_name + ".json", 'w') as file:
+            json.dump(tags, file, indent=2)
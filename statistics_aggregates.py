@@ -0,0 +1,183 @@
+from typing import List, Tuple
+from pandas.core.frame import DataFrame
+from columnar_statistics import iterate_series, without_rows_condition
+
+import numpy as np
+import pandas as pd
+
+# per-simulation aggregates of the statistics of an algorithm, see error_model.StatisticsSummary
+aggregate_columns = ['time_steps', 'detection_count', 'band_width_used_sum', 'band_width_used_min',
+                     'band_width_used_max', 'memory_used_sum', 'memory_used_min', 'memory_used_max']
+
+def table_exists(db_conn, table_name: str) -> bool:
+    return db_conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+                           [table_name]).fetchone() is not None
+
+def id_condition(column: str, id_range: Tuple[int, int] = None):
+    """
+    Returns a condition restricting the column to the simulation ids after id_range[0] up to id_range[1] and its
+    arguments, all simulations without id_range
+    """
+    if id_range is None:
+        return "1", []
+    return f"{column} > ? AND {column} <= ?", list(id_range)
+
+def _unsummarized(db_conn, fault_model: str, algorithm: str, id_range: Tuple[int, int] = None):
+    """
+    Returns a subquery of the simulations without summary of the algorithm and its arguments.
+    Only their statistics have to be aggregated from the statistics tables
+    """
+    condition, arguments = id_condition("id", id_range)
+    if not table_exists(db_conn, 'simulation_summary'):
+        return f"SELECT id FROM simulation WHERE {condition}", arguments
+    return f"SELECT id FROM simulation WHERE {condition} AND id NOT IN (SELECT simulation_id " \
+           f"FROM simulation_summary WHERE fault_model = ? AND algorithm = ?)", arguments + [fault_model, algorithm]
+
+def _unsummarized_series(db_conn, table_name: str, fault_model: str, algorithm: str, chunk_size: int,
+                         id_range: Tuple[int, int] = None):
+    """
+    Yields the simulation ids and columns of the compressed series of the simulations without summary, the series
+    are decoded one chunk of simulations at a time. Simulations that still have statistics rows are aggregated from
+    the rows
+    """
+    if not table_exists(db_conn, 'statistics_series'):
+        return
+    unsummarized, arguments = _unsummarized(db_conn, fault_model, algorithm, id_range)
+    simulation_ids = [row[0] for row in db_conn.execute(
+        f"SELECT simulation_id FROM statistics_series WHERE table_name = ? AND simulation_id IN ({unsummarized}) "
+        f"AND {without_rows_condition(db_conn, table_name)} ORDER BY simulation_id", [table_name] + arguments)]
+    for i in range(0, len(simulation_ids), chunk_size):
+        yield from iterate_series(db_conn, table_name, simulation_ids[i:i+chunk_size])
+
+def fetch_simulation_parameters(db_conn, id_range: Tuple[int, int] = None) -> DataFrame:
+    """
+    Returns the parameters of every simulation used to group the reports, including the number of variables
+    """
+    condition, arguments = id_condition("simulation.id", id_range)
+    return pd.read_sql_query(f"""
+        SELECT simulation.id, simulation.number_of_nodes, variables.number_of_variables, simulation.delay_type,
+               simulation.category
+        FROM simulation LEFT JOIN (
+            SELECT simulation_id, SUM(value) AS number_of_variables
+            FROM number_of_variables_per_node GROUP BY simulation_id) AS variables
+        ON variables.simulation_id = simulation.id
+        WHERE {condition}""", db_conn, params=arguments)
+
+def fetch_simulation_aggregates(db_conn, prefix: str, algorithm: str, chunk_size: int = 1000,
+                                id_range: Tuple[int, int] = None) -> DataFrame:
+    """
+    Returns one row of aggregate_columns per simulation with statistics of the algorithm, of the simulations in
+    id_range if given.
+    The aggregates are read from the summaries written during the run. Simulations without summary are aggregated
+    by SQL from the statistics rows or streamed in chunks from the compressed series
+    """
+    fault_model = prefix.rstrip('_')
+    table_name = prefix + algorithm + '_statistics'
+    frames: List[DataFrame] = []
+    condition, condition_arguments = id_condition("simulation_id", id_range)
+    if table_exists(db_conn, 'simulation_summary'):
+        frames.append(pd.read_sql_query(
+            f"SELECT simulation_id, {','.join(aggregate_columns)} FROM simulation_summary "
+            f"WHERE fault_model = ? AND algorithm = ? AND {condition}", db_conn,
+            params=[fault_model, algorithm] + condition_arguments))
+    unsummarized, arguments = _unsummarized(db_conn, fault_model, algorithm, id_range)
+    if table_exists(db_conn, table_name):
+        frames.append(pd.read_sql_query(f"""
+            SELECT simulation_id, COUNT(*) AS time_steps, SUM(error_detected) AS detection_count,
+                   SUM(band_width_used) AS band_width_used_sum, MIN(band_width_used) AS band_width_used_min,
+                   MAX(band_width_used) AS band_width_used_max, SUM(memory_used) AS memory_used_sum,
+                   MIN(memory_used) AS memory_used_min, MAX(memory_used) AS memory_used_max
+            FROM {table_name} WHERE simulation_id IN ({unsummarized}) GROUP BY simulation_id""",
+            db_conn, params=arguments))
+    rows = []
+    for simulation_id, columns in _unsummarized_series(db_conn, table_name, fault_model, algorithm, chunk_size,
+                                                       id_range):
+        if len(columns['time']) == 0:
+            continue
+        rows.append([simulation_id, len(columns['time']), int(columns['error_detected'].sum()),
+                     int(columns['band_width_used'].sum()), int(columns['band_width_used'].min()),
+                     int(columns['band_width_used'].max()), int(columns['memory_used'].sum()),
+                     int(columns['memory_used'].min()), int(columns['memory_used'].max())])
+    frames.append(DataFrame(rows, columns=['simulation_id'] + aggregate_columns))
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return DataFrame(columns=['simulation_id'] + aggregate_columns)
+    return pd.concat(frames, ignore_index=True)
+
+def fetch_detection_times(db_conn, prefix: str, algorithm: str, id_range: Tuple[int, int] = None) -> DataFrame:
+    """
+    Returns the first time step in the fault space and the first detection of every simulation, NULL if there was
+    none. The first fault is only known from the summaries, simulations without summary are left out
+    """
+    if not table_exists(db_conn, 'simulation_summary'):
+        return DataFrame(columns=['simulation_id', 'first_fault_time', 'first_detection_time'])
+    condition, arguments = id_condition("simulation_id", id_range)
+    return pd.read_sql_query(f"SELECT simulation_id, first_fault_time, first_detection_time FROM simulation_summary "
+                             f"WHERE fault_model = ? AND algorithm = ? AND {condition}", db_conn,
+                             params=[prefix.rstrip('_'), algorithm] + arguments)
+
+def _add_at(array: np.ndarray, times: np.ndarray, values) -> np.ndarray:
+    """
+    Adds the values at the times to the array, which is extended as needed
+    """
+    if len(times) == 0:
+        return array
+    length = int(times.max()) + 1
+    if length > len(array):
+        array = np.concatenate([array, np.zeros(length - len(array), dtype=array.dtype)])
+    np.add.at(array, times, values)
+    return array
+
+def fetch_detections_per_time(db_conn, prefix: str, algorithm: str, chunk_size: int = 1000,
+                              id_range: Tuple[int, int] = None) -> DataFrame:
+    """
+    Returns the number of detected errors of all simulations, or the simulations in id_range, per time step,
+    indexed by time.
+    Summarized simulations contribute their detection intervals, the others are aggregated by SQL or streamed
+    """
+    fault_model = prefix.rstrip('_')
+    table_name = prefix + algorithm + '_statistics'
+    # time steps start at 1, index 0 stays empty
+    detections = np.zeros(1, dtype=np.int64)
+    # an interval [start, end] adds 1 at start and -1 after end, the prefix sum is the number of open intervals
+    interval_changes = np.zeros(1, dtype=np.int64)
+    max_time = 0
+
+    if table_exists(db_conn, 'simulation_summary'):
+        condition, condition_arguments = id_condition("simulation_id", id_range)
+        summary_arguments = [fault_model, algorithm] + condition_arguments
+        summaries = f"SELECT id FROM simulation_summary WHERE fault_model = ? AND algorithm = ? AND {condition}"
+        # the starts and ends of a summary are inserted in the same order
+        starts = pd.read_sql_query(f"SELECT value FROM detection_starts WHERE simulation_summary_id IN ({summaries}) "
+                                   f"ORDER BY simulation_summary_id, id", db_conn, params=summary_arguments)
+        ends = pd.read_sql_query(f"SELECT value FROM detection_ends WHERE simulation_summary_id IN ({summaries}) "
+                                 f"ORDER BY simulation_summary_id, id", db_conn, params=summary_arguments)
+        interval_changes = _add_at(interval_changes, starts['value'].to_numpy(dtype=np.int64), 1)
+        interval_changes = _add_at(interval_changes, ends['value'].to_numpy(dtype=np.int64) + 1, -1)
+        max_time = db_conn.execute(f"SELECT COALESCE(MAX(time_steps), 0) FROM simulation_summary "
+                                   f"WHERE fault_model = ? AND algorithm = ? AND {condition}",
+                                   summary_arguments).fetchone()[0]
+
+    unsummarized, arguments = _unsummarized(db_conn, fault_model, algorithm, id_range)
+    if table_exists(db_conn, table_name):
+        per_time = np.array(db_conn.execute(f"SELECT time, SUM(error_detected) FROM {table_name} "
+                                            f"WHERE simulation_id IN ({unsummarized}) GROUP BY time",
+                                            arguments).fetchall(), dtype=np.int64).reshape(-1, 2)
+        detections = _add_at(detections, per_time[:, 0], per_time[:, 1])
+    for simulation_id, columns in _unsummarized_series(db_conn, table_name, fault_model, algorithm, chunk_size,
+                                                       id_range):
+        detections = _add_at(detections, columns['time'], columns['error_detected'].astype(np.int64))
+
+    max_time = max(max_time, len(detections) - 1)
+    detections = np.concatenate([detections, np.zeros(max_time + 1 - len(detections), dtype=np.int64)])
+    open_intervals = np.cumsum(interval_changes)[:max_time + 1]
+    detections[:len(open_intervals)] += open_intervals
+    return DataFrame({'error_detected': detections[1:]}, index=pd.RangeIndex(1, max_time + 1, name='time'))
+
+def add_detections_per_time(table: DataFrame, other: DataFrame) -> DataFrame:
+    """
+    Returns the sum of two tables of fetch_detections_per_time, e.g. of the simulations before and after an id
+    """
+    max_time = max(len(table), len(other))
+    index = pd.RangeIndex(1, max_time + 1, name='time')
+    return table.reindex(index, fill_value=0) + other.reindex(index, fill_value=0)
@@ -0,0 +1,274 @@
+from typing import Iterator, List, Tuple
+from base_model import ParameterCategories
+from columnar_statistics import encode_series, insert_encoded_series, statistics_tables
+
+import argparse
+import os
+import pickle
+import sqlite3
+import struct
+
+import database
+
+class StorageBackend:
+    """
+    Destination of the simulation results and the campaign journal.
+    Backends are opened lazily by the first write, so they can be created before the processes writing to them
+    are forked. The journal can be read without opening the backend
+    """
+
+    def write_started(self, seed: int):
+        """
+        Journals a campaign seed as in flight
+        """
+        pass
+
+    def write_result(self, result):
+        """
+        Writes a SimulationResult and journals its seed as completed. It is durable after the next commit
+        """
+        pass
+
+    def commit(self):
+        pass
+
+    def read_journal(self) -> List[Tuple[int, bool]]:
+        """
+        Returns the seed and completion of every journaled seed
+        """
+        return []
+
+    def read_category_counts(self) -> List[int]:
+        """
+        Returns the number of completed seeds of the journal per category, indexed by the category value
+        """
+        return [0] * len(ParameterCategories)
+
+    def close(self):
+        pass
+
+class NullStorage(StorageBackend):
+    """
+    Drops everything, for measuring the simulations alone
+    """
+    pass
+
+class SQLiteStorage(StorageBackend):
+    """
+    Results database written with the database module. There is a single database connection per process
+    """
+    database_name: str
+    statistics_format: str
+
+    def __init__(self, database_name: str, statistics_format: str = 'rows'):
+        self.database_name = database_name
+        self.statistics_format = statistics_format
+        self.opened = False
+
+    def open(self):
+        if not self.opened:
+            database.connect(self.database_name)
+            self.opened = True
+
+    def write_started(self, seed: int):
+        self.open()
+        database.journal_started(seed)
+
+    def write_result(self, result):
+        self.open()
+        simulation_reference = database.insert_table('simulation', cls=result.parameters)
+        if result.control_statistics is not None:
+            database.write_statistics('control_', result.control_statistics, simulation_reference,
+                                      self.statistics_format)
+            database.write_statistics('infrastructure_', result.infrastructure_statistics, simulation_reference,
+                                      self.statistics_format)
+            database.write_summaries('control_', result.control_statistics.summaries, simulation_reference)
+            database.write_summaries('infrastructure_', result.infrastructure_statistics.summaries,
+                                     simulation_reference)
+        database.write_classifications(result.control_fault_classifications, simulation_reference)
+        if result.seed is not None:
+            database.journal_completed(result.seed, simulation_reference, result.cell)
+
+    def commit(self):
+        if self.opened:
+            database.commit()
+
+    def read_journal(self) -> List[Tuple[int, bool]]:
+        if not os.path.exists(self.database_name):
+            return []
+        connection = sqlite3.connect(self.database_name)
+        try:
+            return connection.execute("SELECT seed, completed FROM campaign_journal ORDER BY id").fetchall()
+        except sqlite3.OperationalError:
+            # the database was created by an older version or no simulation was started yet
+            return []
+        finally:
+            connection.close()
+
+    def read_category_counts(self) -> List[int]:
+        counts = [0] * len(ParameterCategories)
+        if not os.path.exists(self.database_name):
+            return counts
+        connection = sqlite3.connect(self.database_name)
+        try:
+            for category, count in connection.execute(
+                    "SELECT simulation.category, COUNT(*) FROM campaign_journal JOIN simulation "
+                    "ON simulation.id = campaign_journal.simulation_id WHERE campaign_journal.completed "
+                    "GROUP BY simulation.category"):
+                counts[ParameterCategories[category].value] = count
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            connection.close()
+        return counts
+
+    def close(self):
+        if self.opened:
+            database.con.close()
+            self.opened = False
+
+record_header = struct.Struct('<I')
+
+class BinaryStorage(StorageBackend):
+    """
+    Append-only file of length-prefixed pickled records, the statistics are stored as compressed series
+    (see columnar_statistics). Appending needs neither indexes nor transactions, the file can be converted to
+    a SQLite database after the campaign. A record cut off by a crash is removed before the next record is appended
+    """
+    file_name: str
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.file = None
+
+    def _append(self, record):
+        if self.file is None:
+            # records appended after a partial record would be read as part of it
+            if os.path.exists(self.file_name):
+                complete_length = 0
+                for complete_length, _ in _complete_records(self.file_name):
+                    pass
+                if complete_length < os.path.getsize(self.file_name):
+                    os.truncate(self.file_name, complete_length)
+            self.file = open(self.file_name, 'ab')
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        self.file.write(record_header.pack(len(data)) + data)
+
+    def write_started(self, seed: int):
+        self._append(('started', seed))
+
+    def write_result(self, result):
+        series = dict()
+        summaries = dict()
+        for prefix, statistics in [('control_', result.control_statistics),
+                                   ('infrastructure_', result.infrastructure_statistics)]:
+            if statistics is None:
+                continue
+            for algorithm in ['full_state', 'timestamp', 'token']:
+                algorithm_statistics = getattr(statistics, algorithm + '_statistics')
+                series[prefix + algorithm + '_statistics'] = (len(algorithm_statistics),
+                                                              encode_series(algorithm_statistics))
+            summaries[prefix] = statistics.summaries
+        self._append(('result', result.seed, result.parameters, result.control_fault_classifications, series,
+                      summaries))
+
+    def commit(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def read_journal(self) -> List[Tuple[int, bool]]:
+        journal = []
+        for record in read_records(self.file_name):
+            if record[0] == 'started':
+                journal.append((record[1], False))
+            elif record[1] is not None:
+                journal.append((record[1], True))
+        return journal
+
+    def read_category_counts(self) -> List[int]:
+        counts = [0] * len(ParameterCategories)
+        completed = set()
+        for record in read_records(self.file_name):
+            # a seed issued again can have two result records
+            if record[0] == 'result' and record[1] is not None and record[1] not in completed:
+                completed.add(record[1])
+                counts[record[2].category.value] += 1
+        return counts
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def _complete_records(file_name: str) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yields the file offset after every complete record and its pickled data
+    """
+    if not os.path.exists(file_name):
+        return
+    with open(file_name, 'rb') as file:
+        while True:
+            header = file.read(record_header.size)
+            if len(header) < record_header.size:
+                return
+            length, = record_header.unpack(header)
+            data = file.read(length)
+            if len(data) < length:
+                return
+            yield file.tell(), data
+
+def read_records(file_name: str) -> Iterator[tuple]:
+    for _, data in _complete_records(file_name):
+        yield pickle.loads(data)
+
+class QueueStorage(StorageBackend):
+    """
+    Sends the journal entries and results to a writer process (see simulation.start_writing)
+    """
+
+    def __init__(self, writes):
+        self.writes = writes
+
+    def write_started(self, seed: int):
+        self.writes.put(('started', seed))
+
+    def write_result(self, result):
+        self.writes.put(('result', result))
+
+def create_storage(storage_type: str, name: str, statistics_format: str = 'rows') -> StorageBackend:
+    if storage_type == 'sqlite':
+        return SQLiteStorage(name, statistics_format)
+    elif storage_type == 'binary':
+        return BinaryStorage(name)
+    elif storage_type == 'null':
+        return NullStorage()
+    raise ValueError(f'Unknown storage {storage_type}')
+
+def convert_to_sqlite(file_name: str, database_name: str):
+    """
+    Writes the records of a binary results file to a SQLite database with series statistics
+    """
+    database.connect(database_name)
+    for record in read_records(file_name):
+        if record[0] == 'started':
+            database.journal_started(record[1])
+            continue
+        _, seed, parameters, classifications, series, summaries = record
+        simulation_reference = database.insert_table('simulation', cls=parameters)
+        for table_name in statistics_tables:
+            if table_name in series:
+                length, values = series[table_name]
+                insert_encoded_series(database.con, table_name, simulation_reference, length, values)
+        for prefix, prefix_summaries in summaries.items():
+            database.write_summaries(prefix, prefix_summaries, simulation_reference)
+        database.write_classifications(classifications, simulation_reference)
+        if seed is not None:
+            database.journal_completed(seed, simulation_reference)
+    database.commit()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converts a binary results file to a SQLite database")
+    parser.add_argument("file")
+    parser.add_argument("database")
+    arguments = parser.parse_args()
+    convert_to_sqlite(arguments.file, arguments.database)
@@ -0,0 +1,20 @@
+import random
+
+from base_model import BaseModelSimulationEnvironment
+from base_model_ensemble import ensemble_base_model_states
+from simulation import get_random_parameters
+
+
+def test_ensemble_reaches_the_states_of_the_base_model():
+    parameter_sets = []
+    for seed in range(60):
+        random.seed(seed)
+        parameter_sets.append(get_random_parameters(10, 5, 5))
+    # short runs end at stop_time, the others when they converge
+    for stop_time in [3, 1000]:
+        ensemble_states = ensemble_base_model_states(parameter_sets, stop_time)
+        for parameters, states in zip(parameter_sets, ensemble_states):
+            env = BaseModelSimulationEnvironment(parameters)
+            env.run(stop_time)
+            # the same insertion order gives the same iteration order, from which the fault spaces are drawn
+            assert list(states) == list(env.nodes[0].reached_states)
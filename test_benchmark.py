@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+import time
+
+import benchmark
+from benchmark import compare, corpus, corpus_sizes, measure
+from delay_functions import DelayTypes
+from result_cache import hash_parameters
+
+
+def test_corpus_is_fixed_and_covers_delay_types_and_sizes():
+    parameter_sets = corpus()
+    assert set(parameters.delay_type for _, parameters in parameter_sets) == set(DelayTypes)
+    assert set((parameters.number_of_nodes, sum(parameters.number_of_variables_per_node))
+               for _, parameters in parameter_sets) == set(corpus_sizes)
+    assert [hash_parameters(parameters) for _, parameters in parameter_sets] == \
+        [hash_parameters(parameters) for _, parameters in corpus()]
+
+def test_only_changes_beyond_the_thresholds_are_regressions():
+    baseline = {'results': {'base/a': {'wall_seconds': 1.0, 'ticks_per_second': 100, 'events_per_second': 0,
+                                       'peak_memory_bytes': 1000}}}
+    results = {'results': {'base/a': {'wall_seconds': 1.05, 'ticks_per_second': 80, 'events_per_second': 10,
+                                      'peak_memory_bytes': 500},
+                           'base/new': {'wall_seconds': 9.0, 'ticks_per_second': 1, 'events_per_second': 1,
+                                        'peak_memory_bytes': 1}}}
+    regressions = compare(results, baseline)
+    assert len(regressions) == 1 and regressions[0].startswith('base/a ticks_per_second')
+
+def test_rates_are_those_of_the_fastest_run(monkeypatch):
+    monkeypatch.setattr(benchmark, "min_total_seconds", 0)
+    # runs stopped by the time budget simulate different numbers of time steps, the shortest run is not the fastest.
+    # The last run is the memory run
+    runs = iter([(0.05, 100, False), (0.01, 10, True), (0.03, 90, True), (0.2, 10, True)])
+
+    def run():
+        duration, ticks, timed_out = next(runs)
+        time.sleep(duration)
+        return SimpleNamespace(time=ticks, event_count=2 * ticks, timed_out=timed_out)
+    result = measure(run, 3)
+    assert (result['ticks'], result['events']) == (90, 180)
+    assert result['ticks_per_second'] == 90 / result['wall_seconds']
+    assert result['timed_out'] and result['memory_run_timed_out']
@@ -0,0 +1,31 @@
+import itertools
+
+from base_model import ParameterCategories
+from campaign import campaign_seeds, parse_targets, resume_seeds, shard_targets, targets_reached
+
+
+def test_shards_partition_the_seed_range():
+    shards = [list(campaign_seeds(10, 30, i, 3)) for i in range(3)]
+    assert sorted(itertools.chain(*shards)) == list(range(10, 30))
+    assert shards[1] == list(campaign_seeds(10, 30, 1, 3))
+
+def test_unbounded_shard():
+    assert list(itertools.islice(campaign_seeds(5, None, 1, 2), 3)) == [6, 8, 10]
+
+def test_targets():
+    targets = parse_targets("good=2,BAD=1")
+    assert targets == {ParameterCategories.GOOD: 2, ParameterCategories.BAD: 1}
+    counts = [0] * len(ParameterCategories)
+    counts[ParameterCategories.GOOD.value] = 2
+    assert not targets_reached(targets, counts)
+    counts[ParameterCategories.BAD.value] = 1
+    assert targets_reached(targets, counts)
+
+    # the targets of the shards add up to the campaign targets
+    shards = [shard_targets({ParameterCategories.GOOD: 10, ParameterCategories.BAD: 2}, i, 3) for i in range(3)]
+    assert [shard[ParameterCategories.GOOD] for shard in shards] == [4, 3, 3]
+    assert [shard[ParameterCategories.BAD] for shard in shards] == [1, 1, 0]
+
+def test_resume_from_journal():
+    journal = [(0, True), (3, False), (2, True), (5, False)]
+    assert list(resume_seeds(campaign_seeds(0, 8), journal)) == [3, 5, 1, 4, 6, 7]
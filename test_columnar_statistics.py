@@ -0,0 +1,68 @@
+import sqlite3
+
+from columnar_statistics import create_series_table, insert_series, migrate, read_statistics
+from error_model import Statistics
+
+
+def make_statistics(length, offset):
+    statistics = []
+    for i in range(length):
+        statistic = Statistics()
+        statistic.time = i + 1
+        statistic.error_detected = (i + offset) % 7 == 0
+        statistic.band_width_used = (i * offset) % 13
+        statistic.memory_used = i + offset
+        statistics.append(statistic)
+    return statistics
+
+def test_series_round_trip():
+    connection = sqlite3.connect(":memory:")
+    create_series_table(connection)
+    statistics = make_statistics(100, 3)
+    insert_series(connection, "control_token_statistics", statistics, 4)
+    table = read_statistics(connection, "control_token_statistics")
+    assert list(table["simulation_id"].unique()) == [4]
+    assert list(table["time"]) == [s.time for s in statistics]
+    assert list(table["error_detected"]) == [s.error_detected for s in statistics]
+    assert list(table["memory_used"]) == [s.memory_used for s in statistics]
+    assert read_statistics(connection, "control_timestamp_statistics").empty
+
+def write_rows(database):
+    connection = sqlite3.connect(database)
+    connection.execute("CREATE TABLE control_token_statistics (id INTEGER PRIMARY KEY, simulation_id INTEGER, "
+                       "time INTEGER, error_detected INTEGER, band_width_used INTEGER, memory_used INTEGER)")
+    for simulation_id in [1, 2, 3]:
+        for s in make_statistics(10 * simulation_id, simulation_id):
+            connection.execute("INSERT INTO control_token_statistics(simulation_id,time,error_detected,band_width_used,"
+                               "memory_used) VALUES (?,?,?,?,?)",
+                               [simulation_id, s.time, s.error_detected, s.band_width_used, s.memory_used])
+    connection.commit()
+    rows = read_statistics(connection, "control_token_statistics")
+    connection.close()
+    return rows
+
+def test_migration(tmp_path):
+    database = str(tmp_path / "rows.db")
+    rows = write_rows(database)
+
+    # small chunks split the series of a simulation
+    migrate(database, drop_rows=True, chunk_size=7)
+    migrate(database)
+    connection = sqlite3.connect(database)
+    series = read_statistics(connection, "control_token_statistics")
+    assert connection.execute("SELECT COUNT(*) FROM statistics_series").fetchone()[0] == 3
+    assert series.astype(int).equals(rows.astype(int))
+
+def test_migration_keeping_the_rows(tmp_path):
+    database = str(tmp_path / "rows.db")
+    rows = write_rows(database)
+    sqlite3.connect(database).execute("CREATE TABLE control_timestamp_statistics (id INTEGER PRIMARY KEY, "
+                                      "simulation_id INTEGER, time INTEGER, error_detected INTEGER, "
+                                      "band_width_used INTEGER, memory_used INTEGER)")
+    # an empty statistics table is skipped
+    migrate(database)
+    connection = sqlite3.connect(database)
+    assert connection.execute("SELECT COUNT(*) FROM statistics_series").fetchone()[0] == 3
+    # every simulation is read once although it is stored as rows and as series
+    assert read_statistics(connection, "control_token_statistics").astype(int).equals(rows.astype(int))
+    assert len(read_statistics(connection, "control_token_statistics", [2])) == 20
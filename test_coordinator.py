@@ -0,0 +1,49 @@
+from multiprocessing import Process
+import sqlite3
+
+import coordinator
+import simulation
+from base_model import ParameterCategories
+from coordinator import Coordinator, run_worker
+from simulation import SimulationResult, get_random_parameters
+from storage import NullStorage, SQLiteStorage
+
+
+def test_batches_issued_again_are_released():
+    campaign = Coordinator(("localhost", 0), b"test", iter([1, 2]), NullStorage(), batch_size=3)
+    original = campaign._next_batch(0)
+    # the deadline of the original batch passed, another worker gets its seeds
+    campaign._reissue(original)
+    again = campaign._next_batch(1)
+    assert again.seeds == [1, 2]
+    for seed in original.seeds:
+        result = SimulationResult(get_random_parameters(4, 3, 3), seed=seed)
+        result.parameters.category = ParameterCategories.GOOD
+        campaign._write(('result', original.id, seed, result))
+    assert campaign.finished()
+    # the results of the batch issued again are dropped
+    campaign._write(('result', again.id, 1, result))
+    assert campaign.counts[ParameterCategories.GOOD.value] == 2
+    campaign.listener.close()
+
+def test_local_campaign_writes_every_seed_once(tmp_path, monkeypatch):
+    # the workers are forked and inherit the short simulations
+    monkeypatch.setattr(simulation, "stop_time", 100)
+    monkeypatch.setattr(coordinator, "result_cache_directory", str(tmp_path / "cache"))
+    seeds = [2, 3, 6, 8, 10, 19, 22, 28]
+    storage = SQLiteStorage(str(tmp_path / "results.db"))
+    # deadlines shorter than the simulations issue batches again while their workers are still simulating them
+    campaign = Coordinator(("localhost", 0), b"test", iter(seeds), storage, batch_size=2, batch_timeout=0.01)
+    workers = [Process(target=run_worker, args=(campaign.listener.address, b"test")) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    campaign.run(status_interval=60)
+    for worker in workers:
+        worker.join(timeout=30)
+        assert worker.exitcode == 0
+    storage.close()
+
+    assert sorted(storage.read_journal()) == [(seed, 1) for seed in seeds]
+    connection = sqlite3.connect(str(tmp_path / "results.db"))
+    assert connection.execute("SELECT COUNT(*) FROM simulation").fetchone()[0] == len(seeds)
+    assert sum(campaign.counts) == len(seeds)
@@ -1,31 +1,36 @@
-import delay_functions
 import numpy
 
+from delay_functions import DelayGenerator
+
 min_delay = 20
 max_delay = 100
+max_jitter = 2
 half_period = 5
 step = 1
-time = 0
 
-ud_values = []
-nd_values = []
-ed_values = []
-sw_values = []
-twlh_values = []
-twhl_values = []
 
-for i in range(0,1000000):
-    ud_values.append(delay_functions.delay_uniform_distribution(min_delay, max_delay))
-    nd_values.append(delay_functions.delay_normal_distribution(min_delay, max_delay))
-    ed_values.append(delay_functions.delay_exponential_distribution(min_delay, max_delay))
-    sw_values.append(delay_functions.delay_square_wave(min_delay, max_delay, time, half_period))
-    twlh_values.append(delay_functions.delay_triangle_wave(min_delay, max_delay, time, step, True))
-    twhl_values.append(delay_functions.delay_triangle_wave(min_delay, max_delay, time, step, False))
-    time += 1
+def sample_delays(count: int):
+    generator = DelayGenerator()
+    values = {"Uniform Distribution": [], "Normal Distribution": [], "Exponential Distribution": [],
+              "Square Wave": [], "Triangle Wave Low to High": [], "Triangle Wave High to Low": []}
+    for time in range(count):
+        values["Uniform Distribution"].append(generator.delay_uniform_distribution(min_delay, max_delay))
+        values["Normal Distribution"].append(generator.delay_normal_distribution(min_delay, max_delay))
+        values["Exponential Distribution"].append(generator.delay_exponential_distribution(min_delay, max_delay))
+        values["Square Wave"].append(generator.delay_square_wave(min_delay, max_delay, max_jitter, time, half_period))
+        values["Triangle Wave Low to High"].append(generator.delay_triangle_wave(min_delay, max_delay, max_jitter,
+                                                                                 time, step, True))
+        values["Triangle Wave High to Low"].append(generator.delay_triangle_wave(min_delay, max_delay, max_jitter,
+                                                                                 time, step, False))
+    return values
+
+def test_delays_stay_between_min_and_max_delay():
+    for name, delays in sample_delays(10000).items():
+        # the triangle waves are only clamped at their start, the jitter can cross the other end
+        low = min_delay - max_jitter if name == "Triangle Wave Low to High" else min_delay
+        high = max_delay + max_jitter if name == "Triangle Wave High to Low" else max_delay
+        assert low <= numpy.min(delays) and numpy.max(delays) <= high, name
 
-print(f"Uniform Distribution:\nMin:{numpy.min(ud_values)}\nMax:{numpy.max(ud_values)}\nAvg:{numpy.average(ud_values)}\n")
-print(f"Normal Distribution:\nMin:{numpy.min(nd_values)}\nMax:{numpy.max(nd_values)}\nAvg:{numpy.average(nd_values)}\n")
-print(f"Exponential Distribution:\nMin:{numpy.min(ed_values)}\nMax:{numpy.max(ed_values)}\nAvg:{numpy.average(ed_values)}\n")
-print(f"Square Wave:\nMin:{numpy.min(sw_values)}\nMax:{numpy.max(sw_values)}\nAvg:{numpy.average(sw_values)}\n")
-print(f"Triangle Wave Low to High:\nMin:{numpy.min(twlh_values)}\nMax:{numpy.max(twlh_values)}\nAvg:{numpy.average(twlh_values)}\n")
-print(f"Triangle Wave High to Low:\nMin:{numpy.min(twhl_values)}\nMax:{numpy.max(twhl_values)}\nAvg:{numpy.average(twhl_values)}\n")
\ No newline at end of file
+if __name__ == "__main__":
+    for name, delays in sample_delays(1000000).items():
+        print(f"{name}:\nMin:{numpy.min(delays)}\nMax:{numpy.max(delays)}\nAvg:{numpy.average(delays)}\n")
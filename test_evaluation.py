@@ -0,0 +1,36 @@
+from pandas.core.frame import DataFrame
+
+import pandas as pd
+import pytest
+
+from evaluation import detection_delay_statistics
+
+
+def test_detection_delays_per_group():
+    # simulation 3 never detected its fault, simulation 4 never reached the fault space
+    statistics = DataFrame({"simulation_id": [1, 2, 3, 4, 5],
+                            "first_fault_time": [10, 20, 5, None, 30],
+                            "first_detection_time": [15, 40, None, None, 31]})
+    simulation_table = DataFrame({"id": [1, 2, 3, 4, 5], "number_of_nodes": [2, 2, 2, 3, 3],
+                                  "number_of_variables": [4, 6, 4, 6, 6], "delay_type": ["A", "A", "B", "B", "B"]})
+    tables = detection_delay_statistics(statistics, simulation_table)
+
+    nodes = tables["number_of_nodes"].set_index("number_of_nodes")
+    assert list(nodes["simulations"]) == [3, 1]
+    assert list(nodes["detected"]) == [2, 1]
+    assert list(nodes["mean"]) == [12.5, 1]
+    assert list(nodes["min"]) == [5, 1] and list(nodes["max"]) == [20, 1]
+    assert nodes.loc[2, "50%"] == 12.5 and nodes.loc[2, "90%"] == pytest.approx(18.5)
+    assert pd.isna(nodes.loc[3, "std"])
+
+    variables = tables["number_of_variables"].set_index("number_of_variables")
+    assert list(variables["simulations"]) == [2, 2]
+    assert list(variables["detected"]) == [1, 2]
+    assert variables.loc[6, "99%"] == pytest.approx(19.81)
+
+    delay_types = tables["delay_type"].set_index("delay_type")
+    assert list(delay_types["simulations"]) == [2, 2]
+    assert list(delay_types["detected"]) == [2, 1]
+    assert list(delay_types["mean"]) == [12.5, 1]
+    assert list(tables["delay_type"].columns) == ["delay_type", "simulations", "detected", "mean", "std", "min",
+                                                  "50%", "90%", "99%", "max"]
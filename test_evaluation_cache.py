@@ -0,0 +1,44 @@
+import sqlite3
+
+from evaluation_cache import EvaluationCache
+
+
+def test_entries_fold_in_new_simulations(tmp_path):
+    database = str(tmp_path / "a.db")
+    connection = sqlite3.connect(database)
+    connection.execute("CREATE TABLE simulation (id INTEGER PRIMARY KEY)")
+    connection.commit()
+    cache = EvaluationCache(database, str(tmp_path / "cache"))
+    fetched = []
+
+    def fetch(id_range):
+        fetched.append(id_range)
+        return [row[0] for row in connection.execute("SELECT id FROM simulation WHERE id > ? AND id <= ?", id_range)]
+
+    def add_simulations(count):
+        for _ in range(count):
+            connection.execute("INSERT INTO simulation DEFAULT VALUES")
+        connection.commit()
+        return connection.execute("SELECT MAX(id) FROM simulation").fetchone()[0]
+
+    last_id = add_simulations(3)
+    key = cache.key()
+    assert cache.load("ids", last_id, fetch, list.__add__) == [1, 2, 3]
+    cache.mark_done("report", key)
+    # a second cache of the same directory, e.g. in another process
+    assert EvaluationCache(database, str(tmp_path / "cache")).load("ids", last_id, fetch, list.__add__) == [1, 2, 3]
+    assert fetched == [(0, 3)]
+    assert cache.is_done("report")
+
+    last_id = add_simulations(2)
+    assert cache.load("ids", last_id, fetch, list.__add__) == [1, 2, 3, 4, 5]
+    assert fetched == [(0, 3), (3, 5)]
+    assert not cache.is_done("report")
+
+    # a simulation written after the key was taken and before the last id was read is folded in by the next load
+    key = cache.key()
+    last_id = add_simulations(1)
+    assert cache.load("ids", 5, fetch, list.__add__, key) == [1, 2, 3, 4, 5]
+    assert cache.load("ids", last_id, fetch, list.__add__) == [1, 2, 3, 4, 5, 6]
+    assert fetched[-1] == (5, 6)
+    connection.close()
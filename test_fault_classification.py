@@ -0,0 +1,40 @@
+import random
+
+from fault_classification import classify_control_faults, control_fault_dwell_times
+
+
+def not_detectable_reference(state_history, fault_space, min_delay):
+    not_detectable = dict()
+    reached_states = set(state for state, _ in state_history)
+    for control_fault in fault_space:
+        not_detectable[control_fault] = True
+        if control_fault in reached_states:
+            for i in range(len(state_history)):
+                if state_history[i][0] == control_fault:
+                    j = i
+                    while state_history[j][0] in fault_space and j+1 < len(state_history):
+                        j += 1
+                    if state_history[j][1] - state_history[i][1] > 2 * min_delay:
+                        not_detectable[control_fault] = False
+                        break
+    return not_detectable
+
+def test_dwell_times_of_runs():
+    history = [(0, 0), (1, 5), (2, 7), (3, 20), (1, 30), (0, 31), (2, 40), (2, 50)]
+    assert control_fault_dwell_times(history, {1, 2, 4}) == {1: 15, 2: 13, 4: 0}
+
+def test_classification_matches_reference():
+    generator = random.Random(0)
+    for _ in range(200):
+        time = 0
+        history = []
+        for _ in range(generator.randint(1, 60)):
+            time += generator.randint(0, 15)
+            history.append((generator.randint(0, 7), time))
+        fault_space = set(generator.choices(range(8), k=generator.randint(1, 5)))
+        min_delay = generator.randint(1, 10)
+        reference = not_detectable_reference(history, fault_space, min_delay)
+        classifications = classify_control_faults(history, fault_space, min_delay)
+        assert len(classifications) == len(fault_space)
+        for classification in classifications:
+            assert reference[classification.state] == (not classification.detectable)
@@ -0,0 +1,59 @@
+import sqlite3
+
+import pytest
+
+from merge_databases import merge_databases
+
+
+def make_shard(path, seeds):
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE simulation (id INTEGER PRIMARY KEY, seed INTEGER)")
+    connection.execute("CREATE TABLE rule_functions_per_node (id INTEGER PRIMARY KEY, simulation_id INTEGER)")
+    connection.execute("CREATE TABLE rule_functions_per_node_elements (id INTEGER PRIMARY KEY, "
+                       "rule_functions_per_node_id INTEGER, value INTEGER)")
+    connection.execute("CREATE TABLE control_token_statistics (id INTEGER PRIMARY KEY, simulation_id INTEGER, "
+                       "time INTEGER)")
+    for seed in seeds:
+        simulation_id = connection.execute("INSERT INTO simulation(seed) VALUES (?)", [seed]).lastrowid
+        for node in range(2):
+            rule_function_id = connection.execute("INSERT INTO rule_functions_per_node(simulation_id) VALUES (?)",
+                                                  [simulation_id]).lastrowid
+            connection.execute("INSERT INTO rule_functions_per_node_elements(rule_functions_per_node_id, value) "
+                               "VALUES (?, ?)", [rule_function_id, seed * 10 + node])
+        connection.execute("INSERT INTO control_token_statistics(simulation_id, time) VALUES (?, ?)", [simulation_id, seed])
+    connection.commit()
+    connection.close()
+
+def test_merge_remaps_references(tmp_path):
+    make_shard(str(tmp_path / "a.db"), [0, 2])
+    make_shard(str(tmp_path / "b.db"), [1, 3, 5])
+    merged = str(tmp_path / "merged.db")
+    merge_databases(merged, [str(tmp_path / "a.db"), str(tmp_path / "b.db")])
+
+    connection = sqlite3.connect(merged)
+    rows = connection.execute("SELECT s.seed, e.value, t.time FROM simulation s "
+                              "JOIN rule_functions_per_node r ON r.simulation_id = s.id "
+                              "JOIN rule_functions_per_node_elements e ON e.rule_functions_per_node_id = r.id "
+                              "JOIN control_token_statistics t ON t.simulation_id = s.id ORDER BY s.seed, e.value").fetchall()
+    assert rows == [(seed, seed * 10 + node, seed) for seed in [0, 1, 2, 3, 5] for node in range(2)]
+    indexes = set(row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'"))
+    assert {"control_token_statistics_simulation_id", "control_token_statistics_time",
+            "rule_functions_per_node_elements_rule_functions_per_node_id"} <= indexes
+
+def test_merge_rejects_shards_with_other_columns(tmp_path):
+    make_shard(str(tmp_path / "a.db"), [0, 2])
+    make_shard(str(tmp_path / "b.db"), [1])
+    connection = sqlite3.connect(str(tmp_path / "b.db"))
+    connection.execute("ANALYZE")
+    connection.execute("ALTER TABLE control_token_statistics ADD COLUMN memory_used INTEGER")
+    connection.execute("CREATE TABLE statistics_series (id INTEGER PRIMARY KEY, simulation_id INTEGER)")
+    connection.close()
+    merged = str(tmp_path / "merged.db")
+    merge_databases(merged, [str(tmp_path / "a.db")])
+
+    with pytest.raises(ValueError, match="memory_used"):
+        merge_databases(merged, [str(tmp_path / "b.db")])
+    connection = sqlite3.connect(merged)
+    assert connection.execute("SELECT seed FROM simulation ORDER BY seed").fetchall() == [(0,), (2,)]
+    tables = set(row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'"))
+    assert "statistics_series" not in tables and "sqlite_stat1" not in tables
@@ -0,0 +1,61 @@
+from queue import Queue
+from signal import SIGINT, getsignal, signal
+from threading import Event
+import json
+import time
+
+from metrics import MetricsCollector, SimulationMetrics, prometheus_text
+from simulation import SimulationResult, get_random_parameters, start_writing
+from storage import NullStorage
+
+
+def test_phase_times_accumulate():
+    metrics = SimulationMetrics()
+    with metrics.phase('base'):
+        pass
+    with metrics.phase('base'):
+        pass
+    assert set(metrics.phase_times) == {'base'}
+    assert metrics.phase_times['base'] >= 0
+
+def test_snapshot_and_export(tmp_path):
+    collector = MetricsCollector(str(tmp_path / 'm.prom'), str(tmp_path / 'm.jsonl'), window=10)
+    collector.started_at = 0
+    for worker, finished_at in [(1, 50), (0, 95), (1, 98), (0, 99)]:
+        collector.record(SimulationMetrics(worker=worker, finished_at=finished_at, ticks=1000, max_event_queue_depth=worker + 3,
+                                           phase_times={'base': 0.5, 'distributed': 1.5, 'db_write': 0.25}))
+    snapshot = collector.snapshot(now=100)
+    assert snapshot['simulations'] == 4
+    assert snapshot['worker_simulations'] == {0: 2, 1: 2}
+    assert snapshot['simulations_per_second'] == 0.3
+    assert snapshot['worker_simulations_per_second'] == {0: 0.2, 1: 0.1}
+    assert snapshot['phase_seconds']['distributed'] == 6
+    assert snapshot['ticks_per_second'] == 500
+    assert snapshot['max_event_queue_depth'] == 4
+    assert snapshot['db_write_seconds_max'] == 0.25
+    assert 'rev_simulations_total{worker="1"} 2' in prometheus_text(snapshot)
+
+    collector.export({0: 12.0})
+    collector.export()
+    assert 'rev_worker_busy_seconds{worker="0"} 12.0' not in (tmp_path / 'm.prom').read_text()
+    lines = (tmp_path / 'm.jsonl').read_text().splitlines()
+    assert len(lines) == 2 and json.loads(lines[0])['worker_busy_seconds'] == {'0': 12.0}
+
+class SlowCommitStorage(NullStorage):
+    def commit(self):
+        time.sleep(0.2)
+
+def test_db_write_includes_the_commit():
+    writes, metrics_queue, stopped = Queue(), Queue(), Event()
+    for _ in range(2):
+        writes.put(('result', SimulationResult(get_random_parameters(4, 3, 3), metrics=SimulationMetrics())))
+    stopped.set()
+    sigint_handler = getsignal(SIGINT)
+    try:
+        start_writing(writes, stopped, SlowCommitStorage(), metrics_queue, max_transaction_time=0.1)
+    finally:
+        # start_writing ignores SIGINT like the writer process
+        signal(SIGINT, sigint_handler)
+    # both results were written in one transaction and share its commit
+    db_writes = [metrics_queue.get().phase_times['db_write'] for _ in range(2)]
+    assert all(0.1 <= db_write < 0.2 for db_write in db_writes)
@@ -0,0 +1,39 @@
+import time
+
+from base_model import ParameterCategories, SimulationParameters
+from delay_functions import DelayTypes
+from prescreening import PreScreening, has_constant_rule_functions
+from simulation_env import SimulationEnvironment
+from simulation_objects import RuleFunction
+
+
+
+def create_parameters(elements):
+    rule_functions = [RuleFunction([e], [True, False]) for e in elements]
+    return SimulationParameters(2, [1, 1], [1, 1], rule_functions, 0, 20, 100, DelayTypes.UNIFORM, 0,
+                                ParameterCategories.UNKNOWN)
+
+def test_constant_rule_functions():
+    assert has_constant_rule_functions(create_parameters([0, 3]))
+    # only the lowest 2^dependencies bits of an element are used
+    assert has_constant_rule_functions(create_parameters([4, 7]))
+    assert not has_constant_rule_functions(create_parameters([0, 2]))
+
+def test_prediction_from_base_model():
+    prescreening = PreScreening(max_bad_state_count=1)
+    assert prescreening.predict_from_base_model(create_parameters([1, 2]), {0}) == ParameterCategories.BAD
+    assert prescreening.predict_from_base_model(create_parameters([1, 2]), {0, 1}) == ParameterCategories.UNKNOWN
+
+class SlowEnvironment(SimulationEnvironment):
+    timeout_after = 0.3
+
+    def handle_time_step(self, time_step: int, events_occured: bool):
+        time.sleep(0.05)
+
+def test_continued_truncated_run_keeps_the_timeout():
+    env = SlowEnvironment()
+    # the truncated run of the pre-screening
+    env.run(4)
+    assert not env.timed_out
+    env.run(100)
+    assert env.timed_out and env.time < 8
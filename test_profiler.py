@@ -0,0 +1,62 @@
+import random
+
+import profiler
+from distributed_model import DistributedModelSimulationEnvironment
+from simulation import get_random_parameters
+
+
+def test_histograms_merge_and_report_percentiles():
+    first = profiler.Histogram()
+    second = profiler.Histogram()
+    for duration in range(1, 101):
+        (first if duration % 2 else second).add(duration * 1000)
+    merged = profiler.Histogram()
+    merged.merge(first)
+    merged.merge(second)
+    assert (merged.count, merged.min, merged.max, merged.total) == (100, 1000, 100000, 5050000)
+    # exact up to the power of two bucket
+    assert 50000 <= merged.percentile(50) < 2 * 50000
+    assert merged.percentile(100) == 100000
+
+def test_timers_only_record_when_enabled():
+    @profiler.timed("work")
+    def work():
+        return 1
+
+    profiler.take()
+    with profiler.timer("block"):
+        work()
+    assert profiler.take() == {}
+    profiler.enable()
+    try:
+        with profiler.timer("block"):
+            work()
+        work()
+    finally:
+        profiler.disable()
+    profile = profiler.take()
+    assert profile["block"].count == 1 and profile["work"].count == 2
+    totals = dict()
+    profiler.merge(totals, profile)
+    profiler.merge(totals, profile)
+    assert profiler.summary(totals)["work"]["count"] == 4
+
+def test_profiled_runs_simulate_the_same():
+    random.seed(3)
+    parameters = get_random_parameters(4, 3, 3)
+    profiler.take()
+    runs = []
+    for enabled in [False, True]:
+        profiler.enable() if enabled else profiler.disable()
+        random.seed(parameters.seed)
+        env = DistributedModelSimulationEnvironment(parameters)
+        try:
+            env.run(500)
+        finally:
+            profiler.disable()
+        runs.append((env.time, env.nodes[0].state_history))
+    assert runs[0] == runs[1]
+    profile = profiler.take()
+    # the handlers calling the handlers of their base class are timed once per call
+    assert profile["DistributedModelSimulationEnvironment.handle_time_step"].count == env.time
+    assert profile["DistributedModelSimulationEnvironment.handle_event"].count <= env.event_count
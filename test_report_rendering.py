@@ -0,0 +1,15 @@
+import pandas as pd
+
+from report_rendering import render_curve, render_table, table_formats
+
+
+def test_tables_and_curves_are_written_in_every_format(tmp_path):
+    table = pd.DataFrame({"delay_type": ["EXPONENTIAL", "UNIFORM"], "mean": [1.5, float("nan")]})
+    for table_format in table_formats:
+        render_table(table, str(tmp_path / "table"), "{:.1f}", table_format)
+        assert (tmp_path / f"table.{table_format}").stat().st_size > 0
+    assert "<td>-</td>" in (tmp_path / "table.html").read_text()
+    assert pd.read_csv(tmp_path / "table.csv").equals(table)
+    render_table(table.iloc[:0], str(tmp_path / "empty"))
+    render_curve(pd.DataFrame({"error_detected": [0, 1, 3]}), str(tmp_path / "curve"), "Curve", "Time", "Errors")
+    assert (tmp_path / "curve.png").exists()
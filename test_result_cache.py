@@ -0,0 +1,36 @@
+from base_model import ParameterCategories, SimulationParameters
+from delay_functions import DelayTypes
+from fault_classification import ControlFaultClassification
+from result_cache import CachedResult, ResultCache, hash_parameters
+from simulation_objects import RuleFunction
+
+
+def create_parameters(seed=1, category=ParameterCategories.UNKNOWN):
+    rule_functions = [RuleFunction([5], [True, False]), RuleFunction([3], [False, True])]
+    return SimulationParameters(2, [1, 1], [1, 1], rule_functions, 0, 20, 100, DelayTypes.NORMAL, seed, category)
+
+def test_parameters_hash_ignores_results():
+    assert hash_parameters(create_parameters()) == hash_parameters(create_parameters(category=ParameterCategories.BAD))
+    assert hash_parameters(create_parameters()) != hash_parameters(create_parameters(seed=2))
+
+def test_cache_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    parameters_hash = hash_parameters(create_parameters())
+    assert cache.load(parameters_hash) is None
+
+    result = CachedResult()
+    result.base_model_states = {0, 1}
+    result.distributed_model_states = {0, 1, 3}
+    result.control_fault_space = {1}
+    classification = ControlFaultClassification()
+    classification.state = 1
+    classification.dwell_time = 50
+    classification.detectable = True
+    result.control_fault_classifications = [classification]
+    cache.store(parameters_hash, result)
+
+    loaded = cache.load(parameters_hash)
+    assert not loaded.timed_out
+    assert loaded.distributed_model_states == {0, 1, 3}
+    assert loaded.control_fault_space == {1}
+    assert [(c.state, c.dwell_time, c.detectable) for c in loaded.control_fault_classifications] == [(1, 50, True)]
@@ -0,0 +1,23 @@
+import json
+import time
+
+from simulation_profiling import SimulationProfiling
+
+
+def busy(seconds):
+    end = time.process_time() + seconds
+    while time.process_time() < end:
+        pass
+
+def test_sampled_simulations_are_dumped(tmp_path):
+    profiling = SimulationProfiling(str(tmp_path), every=2, slower_than=0.1)
+    for seed, seconds in [(0, 0), (1, 0), (3, 0.3)]:
+        session = profiling.start(seed)
+        busy(seconds)
+        profiling.finish(session, seed, None)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == \
+        ["seed_0.json", "seed_0.prof", "seed_3.folded", "seed_3.json"]
+    assert json.loads((tmp_path / "seed_3.json").read_text())["reason"] == "slower_than"
+    stacks = (tmp_path / "seed_3.folded").read_text().splitlines()
+    assert any("busy (test_simulation_profiling.py" in stack for stack in stacks)
@@ -0,0 +1,77 @@
+import random
+import sqlite3
+
+import pandas as pd
+
+from columnar_statistics import migrate
+from error_model import Statistics, StatisticsSummary
+from simulation import SimulationResult, SimulationStatistics, get_random_parameters
+from statistics_aggregates import add_detections_per_time, fetch_detection_times, fetch_detections_per_time, \
+    fetch_simulation_aggregates, fetch_simulation_parameters
+from storage import SQLiteStorage
+
+
+def make_result(seed, length):
+    generator = random.Random(seed)
+    random.seed(seed)
+    statistics = []
+    summary = StatisticsSummary('token')
+    for time in range(1, length + 1):
+        statistic = Statistics()
+        statistic.time = time
+        statistic.error_detected = generator.random() < 0.2
+        statistic.band_width_used = generator.randint(0, 50)
+        statistic.memory_used = generator.randint(0, 50)
+        statistics.append(statistic)
+        summary.add(statistic)
+    summary.first_fault_time = seed or None
+    return SimulationResult(get_random_parameters(4, 3, 3), SimulationStatistics([], [], statistics, [summary]),
+                            SimulationStatistics([], [], [], []), [], seed)
+
+def write_database(path, statistics_format):
+    storage = SQLiteStorage(path, statistics_format)
+    for seed in range(5):
+        storage.write_result(make_result(seed, 20 + 10 * seed))
+    storage.commit()
+    storage.close()
+    return sqlite3.connect(path)
+
+def test_summaries_rows_and_series_agree(tmp_path):
+    rows = write_database(str(tmp_path / "rows.db"), "rows")
+    series = write_database(str(tmp_path / "series.db"), "series")
+    # a migration without drop_rows stores the statistics as rows and as series
+    write_database(str(tmp_path / "both.db"), "rows").close()
+    migrate(str(tmp_path / "both.db"))
+    both = sqlite3.connect(str(tmp_path / "both.db"))
+    summarized = fetch_simulation_aggregates(rows, "control_", "token")
+    summarized_curve = fetch_detections_per_time(rows, "control_", "token")
+    for connection in [rows, series, both]:
+        connection.execute("DELETE FROM simulation_summary")
+        assert fetch_simulation_aggregates(connection, "control_", "token").astype(int).equals(summarized.astype(int))
+        assert fetch_detections_per_time(connection, "control_", "token").equals(summarized_curve)
+
+    per_tick = rows.execute("SELECT time, SUM(error_detected) FROM control_token_statistics GROUP BY time").fetchall()
+    assert list(summarized_curve.itertuples()) == per_tick
+    assert fetch_simulation_aggregates(rows, "infrastructure_", "token").empty
+    assert list(fetch_simulation_parameters(rows)["id"]) == [1, 2, 3, 4, 5]
+
+def test_id_ranges_add_up_to_all_simulations(tmp_path):
+    connection = write_database(str(tmp_path / "rows.db"), "rows")
+    connection.execute("DELETE FROM simulation_summary WHERE simulation_id > 3")
+    aggregates = fetch_simulation_aggregates(connection, "control_", "token")
+    folded = pd.concat([fetch_simulation_aggregates(connection, "control_", "token", id_range=(0, 2)),
+                        fetch_simulation_aggregates(connection, "control_", "token", id_range=(2, 5))])
+    assert folded.sort_values("simulation_id").astype(int).reset_index(drop=True).equals(
+        aggregates.sort_values("simulation_id").astype(int).reset_index(drop=True))
+    curve = add_detections_per_time(fetch_detections_per_time(connection, "control_", "token", id_range=(0, 4)),
+                                     fetch_detections_per_time(connection, "control_", "token", id_range=(4, 5)))
+    assert curve.equals(fetch_detections_per_time(connection, "control_", "token"))
+    assert list(fetch_simulation_parameters(connection, (1, 3))["id"]) == [2, 3]
+
+def test_detection_times_come_from_the_summaries(tmp_path):
+    connection = write_database(str(tmp_path / "rows.db"), "rows")
+    times = fetch_detection_times(connection, "control_", "token", id_range=(1, 5))
+    assert list(times["first_fault_time"]) == [1, 2, 3, 4]
+    first_detections = connection.execute("SELECT MIN(time) FROM control_token_statistics WHERE error_detected "
+                                          "AND simulation_id > 1 GROUP BY simulation_id ORDER BY simulation_id")
+    assert list(times["first_detection_time"]) == [row[0] for row in first_detections]
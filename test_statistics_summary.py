@@ -0,0 +1,29 @@
+import random
+
+from error_model import Statistics, StatisticsSummary
+
+
+def test_summary_matches_statistics():
+    generator = random.Random(3)
+    statistics = []
+    for time in range(1, 500):
+        statistic = Statistics()
+        statistic.time = time
+        statistic.error_detected = generator.random() < 0.3
+        statistic.band_width_used = generator.randint(0, 100)
+        statistic.memory_used = generator.randint(10, 20)
+        statistics.append(statistic)
+    summary = StatisticsSummary('token')
+    for statistic in statistics:
+        summary.add(statistic)
+
+    detections = [s.time for s in statistics if s.error_detected]
+    assert summary.time_steps == len(statistics)
+    assert summary.detection_count == len(detections)
+    assert summary.first_detection_time == detections[0]
+    assert summary.band_width_used_sum == sum(s.band_width_used for s in statistics)
+    assert summary.band_width_used_min == min(s.band_width_used for s in statistics)
+    assert summary.memory_used_max == max(s.memory_used for s in statistics)
+    intervals = [range(start, end + 1) for start, end in zip(summary.detection_starts, summary.detection_ends)]
+    assert [time for interval in intervals for time in interval] == detections
+    assert all(start > end + 1 for start, end in zip(summary.detection_starts[1:], summary.detection_ends))
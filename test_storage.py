@@ -0,0 +1,117 @@
+import random
+import sqlite3
+
+from adaptive_sampler import format_cell
+from base_model import ParameterCategories
+from delay_functions import DelayTypes
+from error_model import Statistics, StatisticsSummary
+from fault_classification import ControlFaultClassification
+from simulation import SimulationResult, SimulationStatistics, get_random_parameters
+from storage import BinaryStorage, NullStorage, SQLiteStorage, convert_to_sqlite
+
+
+def make_result(seed):
+    random.seed(seed)
+    statistics = []
+    for time in range(1, 6):
+        statistic = Statistics()
+        statistic.time = time
+        statistic.error_detected = time == 3
+        statistics.append(statistic)
+    summary = StatisticsSummary('token')
+    for statistic in statistics:
+        summary.add(statistic)
+    classification = ControlFaultClassification()
+    classification.state = 3
+    return SimulationResult(get_random_parameters(4, 3, 3),
+                            SimulationStatistics(statistics, statistics, statistics, [summary]),
+                            SimulationStatistics(statistics, [], statistics),
+                            [classification], seed)
+
+def test_sqlite_storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "results.db"))
+    assert storage.read_journal() == []
+    storage.write_started(1)
+    storage.write_started(2)
+    # a seed issued again is journaled once
+    storage.write_started(1)
+    result = make_result(2)
+    result.parameters.category = ParameterCategories.GOOD
+    storage.write_result(result)
+    storage.commit()
+    storage.close()
+    assert storage.read_journal() == [(1, 0), (2, 1)]
+    # the in flight seed 1 is not counted
+    assert storage.read_category_counts()[ParameterCategories.GOOD.value] == 1
+    assert sum(storage.read_category_counts()) == 1
+
+    connection = sqlite3.connect(str(tmp_path / "results.db"))
+    plan = connection.execute("EXPLAIN QUERY PLAN UPDATE campaign_journal SET completed = 1 WHERE seed = 1").fetchall()
+    assert "campaign_journal_seed" in plan[0][3]
+    assert connection.execute("SELECT COUNT(*) FROM control_token_statistics").fetchone()[0] == 5
+    assert connection.execute("SELECT COUNT(*) FROM infrastructure_timestamp_statistics").fetchone()[0] == 0
+    assert connection.execute("SELECT COUNT(*) FROM rule_functions_per_node").fetchone()[0] == \
+        make_result(2).parameters.number_of_nodes
+    assert connection.execute("SELECT fault_model, algorithm, detection_count, first_detection_time "
+                              "FROM simulation_summary").fetchall() == [("control", "token", 1, 3)]
+    assert connection.execute("SELECT value FROM detection_starts").fetchall() == [(3,)]
+
+def test_sqlite_storage_journals_the_sampled_cell(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "results.db"))
+    storage.write_started(1)
+    storage.write_started(2)
+    result = make_result(1)
+    result.cell = format_cell({'number_of_nodes': 3, 'number_of_variables': 5, 'delay_type': DelayTypes.UNIFORM})
+    storage.write_result(result)
+    # a result without journaled start and without sampler
+    storage.write_result(make_result(3))
+    storage.commit()
+    storage.close()
+    connection = sqlite3.connect(str(tmp_path / "results.db"))
+    assert connection.execute("SELECT seed, cell FROM campaign_journal ORDER BY seed").fetchall() == \
+        [(1, "number_of_nodes=3,number_of_variables=5,delay_type=UNIFORM"), (2, None), (3, None)]
+
+def test_binary_storage(tmp_path):
+    storage = BinaryStorage(str(tmp_path / "results.bin"))
+    storage.write_started(1)
+    storage.write_result(make_result(1))
+    storage.write_started(2)
+    storage.commit()
+    storage.close()
+    # a record cut off by a crash is ignored
+    with open(tmp_path / "results.bin", "ab") as file:
+        file.write(b"\x10\x00\x00\x00partial")
+    assert storage.read_journal() == [(1, False), (1, True), (2, False)]
+
+    convert_to_sqlite(str(tmp_path / "results.bin"), str(tmp_path / "converted.db"))
+    converted = SQLiteStorage(str(tmp_path / "converted.db"))
+    assert converted.read_journal() == [(1, 1), (2, 0)]
+    connection = sqlite3.connect(str(tmp_path / "converted.db"))
+    assert connection.execute("SELECT SUM(length) FROM statistics_series").fetchone()[0] == 25
+    assert connection.execute("SELECT COUNT(*) FROM simulation_summary").fetchone()[0] == 1
+
+def test_binary_storage_resumes_after_a_partial_record(tmp_path):
+    file_name = str(tmp_path / "results.bin")
+    storage = BinaryStorage(file_name)
+    storage.write_started(1)
+    storage.write_result(make_result(1))
+    storage.close()
+    # a crash in the middle of the result record
+    with open(file_name, "r+b") as file:
+        file.truncate(file.seek(0, 2) - 10)
+
+    storage = BinaryStorage(file_name)
+    storage.write_started(2)
+    storage.write_result(make_result(2))
+    storage.close()
+    assert storage.read_journal() == [(1, False), (2, False), (2, True)]
+    assert storage.read_category_counts()[make_result(2).parameters.category.value] == 1
+    convert_to_sqlite(file_name, str(tmp_path / "converted.db"))
+    assert SQLiteStorage(str(tmp_path / "converted.db")).read_journal() == [(1, 0), (2, 1)]
+
+def test_null_storage():
+    storage = NullStorage()
+    storage.write_started(1)
+    storage.write_result(make_result(1))
+    storage.commit()
+    assert storage.read_journal() == []